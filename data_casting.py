@@ -44,11 +44,26 @@ def check_column_type(connection, table_name, column_name):
     check_column_type_query = f"""
         SELECT column_name, data_type
         FROM information_schema.columns
-        WHERE table_name = '{table_name}' AND column_name = '{column_name}';
+        WHERE table_schema = current_schema() AND table_name = '{table_name}' AND column_name = '{column_name}';
     """
     result = connection.execute(text(check_column_type_query))
     return result.fetchone()
 
+def is_text_column(connection, table_name, column_name):
+    """
+        This function checks if a column still holds text, i.e. it hasn't been converted to another type yet (e.g. by an earlier run)
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table  
+            column_name: the name of the column 
+
+        Returns: 
+            True if the column is text or varchar  
+    """
+    column_type = check_column_type(connection, table_name, column_name)
+    return column_type is not None and column_type[1] in ('text', 'character varying')
+
 def get_max_length(connection, table_name, column_name):
     """
         This function determines the maximum length of the longest record in the specified column, e.g. the length of the longest string in a given column 
@@ -90,6 +105,10 @@ def remove_pound_symbol(connection, table_name, column_name):
         Returns: 
             Nothing  
     """
+    # nothing to remove once the column has been converted to a number 
+    if not is_text_column(connection, table_name, column_name):
+        return
+
     remove_pound_sql = f"""
     UPDATE {table_name}
     SET {column_name} = REPLACE({column_name}, '£', '')
@@ -114,7 +133,7 @@ def add_weight_categories(connection, table_name, weight_column, new_column):
     """
     add_column = f"""
     ALTER TABLE {table_name}
-    ADD COLUMN {new_column} VARCHAR(20)
+    ADD COLUMN IF NOT EXISTS {new_column} VARCHAR(20)
     """
     connection.execute(text(add_column))  
     
@@ -150,7 +169,7 @@ def add_primary_key(connection, table_name, column_name):
     check_pk_sql = f"""
     SELECT constraint_name
     FROM information_schema.table_constraints
-    WHERE table_name = '{table_name}' AND constraint_type = 'PRIMARY KEY';
+    WHERE table_schema = current_schema() AND table_name = '{table_name}' AND constraint_type = 'PRIMARY KEY';
     """
     result = connection.execute(text(check_pk_sql))
     pk_exists = result.fetchone() is not None
@@ -214,7 +233,7 @@ def add_foreign_key(connection, table_name, column_name, referenced_table, refer
     FROM information_schema.table_constraints tc
     JOIN information_schema.key_column_usage kcu
     ON tc.constraint_name = kcu.constraint_name
-    WHERE tc.table_name = '{table_name}' AND kcu.column_name = '{column_name}' AND tc.constraint_type = 'FOREIGN KEY';
+    WHERE tc.table_schema = current_schema() AND tc.table_name = '{table_name}' AND kcu.column_name = '{column_name}' AND tc.constraint_type = 'FOREIGN KEY';
     """
     result = connection.execute(text(check_fk_sql))
     fk_exists = result.fetchone() is not None
@@ -242,34 +261,36 @@ def add_foreign_key(connection, table_name, column_name, referenced_table, refer
 
     logging.info(f"Foreign key added to {table_name}.{column_name} referencing {referenced_table}.{referenced_column}.")
 
-def get_primary_keys(connection, table_name):
+def get_primary_keys(connection, table_name, schema=None):
     """
         This function gets the primary keys for a specified table   
         
         Args: 
             connection: connection to the database (i.e. SQL Alchemy engine)
             table_name: name of table   
+            schema: schema of the table, defaults to the connection's default schema 
 
         Returns: 
             Primary keys   
     """
     inspector = inspect(connection)
-    primary_keys = inspector.get_pk_constraint(table_name)['constrained_columns']
+    primary_keys = inspector.get_pk_constraint(table_name, schema=schema)['constrained_columns']
     return primary_keys
 
-def get_foreign_keys(connection, table_name):
+def get_foreign_keys(connection, table_name, schema=None):
     """
         This function gets the foreign keys for a specified table  
         
         Args: 
             connection: connection to the database (i.e. SQL Alchemy engine)
             table_name: name of table   
+            schema: schema of the table, defaults to the connection's default schema 
 
         Returns: 
             Foreign keys   
     """
     inspector = inspect(connection)
-    foreign_keys = inspector.get_foreign_keys(table_name)
+    foreign_keys = inspector.get_foreign_keys(table_name, schema=schema)
     return foreign_keys
 
 
@@ -481,6 +502,10 @@ def clean_date_data(connection, table_name, column_name):
         Returns: 
             Nothing      
     """
+    # nothing to clean once the column has been converted to a date 
+    if not is_text_column(connection, table_name, column_name):
+        return
+
     clean_date_sql = f"""
     UPDATE {table_name}
     SET {column_name} = TO_DATE({column_name}, 'YYYY-MM-DD')
@@ -523,6 +548,15 @@ def convert_to_varchar(connection, table_name, column_name, length):
         Returns: 
             Nothing      
     """
+    # a column converted by an earlier run may now be a primary key, so only its length is changed 
+    if check_column_type(connection, table_name, column_name)[1] == 'character varying':
+        resize_var_sql = f"""
+        ALTER TABLE {table_name}
+        ALTER COLUMN "{column_name}" TYPE VARCHAR({length});
+        """
+        connection.execute(text(resize_var_sql))
+        return
+
     convert_to_var_sql = f"""
     ALTER TABLE {table_name}
     ALTER COLUMN "{column_name}" TYPE VARCHAR({length}) USING CAST("{column_name}" AS VARCHAR({length})),
@@ -610,7 +644,7 @@ def convert_to_boolean(connection, table_name, column_name, new_column_name, con
     check_column_sql = f"""
     SELECT column_name 
     FROM information_schema.columns 
-    WHERE table_name = '{table_name}' AND column_name = '{new_column_name}';
+    WHERE table_schema = current_schema() AND table_name = '{table_name}' AND column_name = '{new_column_name}';
     """
     result = connection.execute(text(check_column_sql)).fetchone()
 
@@ -882,6 +916,129 @@ def text_to_boolean(connection, table_name, column_name, new_column_name, condit
     clean_text_data(connection, table_name, column_name)
     convert_to_boolean(connection, table_name, column_name, new_column_name, condition_1, condition_2)
 
+# TABLE CASTING FUNCTIONS: these functions clean and cast the columns of each table. They take the name of the table to 
+# work on, so that they can also be run on a staging table before it is upserted into an already cast table 
+
+def cast_orders_table(connection, table_name='orders_table'):
+    """
+        This function cleans and casts the columns of the orders table    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'orders_table'   
+
+        Returns: 
+            Nothing      
+    """
+    text_uuid_to_uuid(connection, table_name, 'date_uuid')
+    text_uuid_to_uuid(connection, table_name, 'user_uuid')
+    card_num_to_varchar(connection, table_name, 'card_number')
+    store_code_to_varchar(connection, table_name, 'store_code')
+    store_code_to_varchar(connection, table_name, 'store_code')
+    bigint_to_smallint(connection, table_name, 'product_quantity')
+
+def cast_dim_users(connection, table_name='dim_users'):
+    """
+        This function cleans and casts the columns of the users table    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'dim_users'   
+
+        Returns: 
+            Nothing      
+    """
+    text_to_varchar_255(connection, table_name, 'first_name')
+    text_to_varchar_255(connection, table_name, 'last_name')
+    text_date_to_date(connection, table_name, 'date_of_birth')
+    text_to_varchar_any(connection, table_name, 'country_code')
+    text_uuid_to_uuid(connection, table_name, 'user_uuid')
+    text_date_to_date(connection, table_name, 'join_date')
+
+def cast_dim_store_details(connection, table_name='dim_store_details'):
+    """
+        This function cleans and casts the columns of the store details table    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'dim_store_details'   
+
+        Returns: 
+            Nothing      
+    """
+    text_to_float(connection, table_name, 'longitude')
+    text_to_varchar_255(connection, table_name, 'locality')            
+    store_code_to_varchar(connection, table_name, 'store_code')
+    bigint_to_smallint(connection, table_name, 'staff_numbers')
+    text_date_to_date(connection, table_name, 'opening_date')
+    text_to_varchar_255(connection, table_name, 'store_type') 
+    text_to_float(connection, table_name, 'latitude')
+    text_to_varchar_any(connection, table_name, 'country_code')
+    text_to_varchar_255(connection, table_name, 'continent')
+
+def cast_dim_products(connection, table_name='dim_products'):
+    """
+        This function cleans and casts the columns of the products table, and adds the weight_category and is_removed columns    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'dim_products'   
+
+        Returns: 
+            Nothing      
+    """
+    remove_pound_symbol(connection, table_name, 'product_price')
+    add_weight_categories(connection, table_name, 'weight_in_kg', 'weight_category')
+    text_to_float(connection, table_name, 'product_price')
+    text_to_float(connection, table_name, 'weight_in_kg')
+    ean_to_varchar(connection, table_name, 'EAN')
+    product_to_varchar(connection, table_name, 'product_code')
+    text_date_to_date(connection, table_name, 'date_added')          
+    text_uuid_to_uuid(connection, table_name, 'uuid')
+    text_to_boolean(connection, table_name, 'removed', 'is_removed', 'Still_avaliable', 'Removed')
+
+def cast_dim_date_times(connection, table_name='dim_date_times'):
+    """
+        This function cleans and casts the columns of the date times table    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'dim_date_times'   
+
+        Returns: 
+            Nothing      
+    """
+    num_to_varchar_any(connection, table_name, 'day')
+    num_to_varchar_any(connection, table_name, 'year')
+    num_to_varchar_any(connection, table_name, 'month')
+    text_to_varchar_any(connection, table_name, 'time_period')
+    text_uuid_to_uuid(connection, table_name, 'date_uuid')
+
+def cast_dim_card_details(connection, table_name='dim_card_details'):
+    """
+        This function cleans and casts the columns of the card details table    
+        
+        Args: 
+            connection: connection to the database (i.e. SQL Alchemy engine)
+            table_name: name of table, defaults to 'dim_card_details'   
+
+        Returns: 
+            Nothing      
+    """
+    exp_to_varchar_any(connection, table_name, 'expiry_date')
+    card_num_to_varchar(connection, table_name, 'card_number')
+    text_date_to_date(connection, table_name, 'date_payment_confirmed')
+
+# the casting function of each table, in the order they are run
+TABLE_CASTS = {
+    'orders_table': cast_orders_table,
+    'dim_users': cast_dim_users,
+    'dim_store_details': cast_dim_store_details,
+    'dim_products': cast_dim_products,
+    'dim_date_times': cast_dim_date_times,
+    'dim_card_details': cast_dim_card_details
+}
+
 # Function to run all operations
 def run_all_operations():
     """
@@ -890,11 +1047,12 @@ def run_all_operations():
         2. Creates the SQL engine using init_my_db_engine
         3. Connects to the database and ensures the transaction if commited 
         4. In a try / expect block 
-            Attempts to run the cleaning and converting function
+            Attempts to run the cleaning and converting functions of each table (TABLE_CASTS). These are safe to rerun on tables that are already cast, e.g. after an upsert
             Adds primary keys to the 'orders_table'
             Adds foreign kyes to the other tables 
             Prints the primary and foreign keys 
             If the functions couldn't be run, it prints an error message with an error code 
+        5. If LOAD_MODE is 'shadow', the casting runs against the shadow schema and, if it succeeded, the shadow tables are swapped into place 
         6. Prints a message to confirm the function has been run     
         
         Args: 
@@ -909,64 +1067,28 @@ def run_all_operations():
     # Create an engine by using the init_db_engine() method of DatabaseConnector 
     engine = instance.init_db_engine(prefix="DB") 
 
+    # in shadow mode the tables are cast in the shadow schema, away from readers of the live tables
+    schema = instance.shadow_schema if instance.load_mode == 'shadow' else None
+    succeeded = False
+
     #try to do engine.connect() 
     with engine.connect() as connection:
 
         # Ensure the transaction is committed 
         with connection.begin():      
 
+            # point unqualified table names at the shadow schema for this transaction
+            if schema:
+                connection.execute(text(f'SET LOCAL search_path TO "{schema}"'))
+
             #put the attempt to run the functions in a try block 
             try:
                 
-                # ORDERS TABLE                 
-                text_uuid_to_uuid(connection, 'orders_table', 'date_uuid')
-                text_uuid_to_uuid(connection, 'orders_table', 'user_uuid')
-                card_num_to_varchar(connection,'orders_table', 'card_number')
-                store_code_to_varchar(connection, 'orders_table', 'store_code')
-                store_code_to_varchar(connection, 'orders_table', 'store_code')
-                bigint_to_smallint(connection, 'orders_table', 'product_quantity')
-
-                # DIM USERS TABLE 
-                text_to_varchar_255(connection, 'dim_users', 'first_name')
-                text_to_varchar_255(connection, 'dim_users', 'last_name')
-                text_date_to_date(connection, 'dim_users', 'date_of_birth')
-                text_to_varchar_any(connection, 'dim_users', 'country_code')
-                text_uuid_to_uuid(connection, 'dim_users', 'user_uuid')
-                text_date_to_date(connection, 'dim_users', 'join_date')
-
-                # DIM_STORE_DETAILS
-                text_to_float(connection, 'dim_store_details', 'longitude')
-                text_to_varchar_255(connection, 'dim_store_details', 'locality')            
-                store_code_to_varchar(connection, 'dim_store_details', 'store_code')
-                bigint_to_smallint(connection, 'dim_store_details', 'staff_numbers')
-                text_date_to_date(connection, 'dim_store_details', 'opening_date')
-                text_to_varchar_255(connection, 'dim_store_details', 'store_type') 
-                text_to_float(connection, 'dim_store_details', 'latitude')
-                text_to_varchar_any(connection, 'dim_store_details', 'country_code')
-                text_to_varchar_255(connection, 'dim_store_details', 'continent')
-
-                # DIM PRODUCTS 
-                remove_pound_symbol(connection, 'dim_products', 'product_price')
-                add_weight_categories(connection, 'dim_products', 'weight_in_kg', 'weight_category')
-                text_to_float(connection, 'dim_products', 'product_price')
-                text_to_float(connection, 'dim_products', 'weight_in_kg')
-                ean_to_varchar(connection, 'dim_products', 'EAN')
-                product_to_varchar(connection, 'dim_products', 'product_code')
-                text_date_to_date(connection, 'dim_products', 'date_added')          
-                text_uuid_to_uuid(connection, 'dim_products', 'uuid')
-                text_to_boolean(connection, 'dim_products', 'removed', 'is_removed', 'Still_avaliable', 'Removed')
-
-                # DIM DATE TIMES 
-                num_to_varchar_any(connection, 'dim_date_times', 'day')
-                num_to_varchar_any(connection, 'dim_date_times', 'year')
-                num_to_varchar_any(connection, 'dim_date_times', 'month')
-                text_to_varchar_any(connection, 'dim_date_times', 'time_period')
-                text_uuid_to_uuid(connection, 'dim_date_times', 'date_uuid')
-
-                # DIM CARD DETAILS 
-                exp_to_varchar_any(connection, 'dim_card_details', 'expiry_date')
-                card_num_to_varchar(connection,'dim_card_details', 'card_number')
-                text_date_to_date(connection,'dim_card_details', 'date_payment_confirmed')
+                # cast the columns of each table
+                for table_name, cast_table in TABLE_CASTS.items():
+                    cast_table(connection, table_name)
+
+                # adding primary keys 
                 add_primary_key(connection, 'dim_card_details', 'card_number')
                 add_primary_key(connection, 'dim_date_times', 'date_uuid')
                 add_primary_key(connection, 'dim_products', 'product_code')
@@ -981,16 +1103,23 @@ def run_all_operations():
                 add_foreign_key(connection, 'orders_table', 'user_uuid', 'dim_users', 'user_uuid')
 
                 # view primary keys 
-                primary_keys = get_primary_keys(connection, 'orders_table')
+                primary_keys = get_primary_keys(connection, 'orders_table', schema)
                 logging.info(f"Primary keys for table 'orders_table': {primary_keys}")
 
                 # view foreign keys
-                foreign_keys = get_foreign_keys(connection, 'orders_table')
+                foreign_keys = get_foreign_keys(connection, 'orders_table', schema)
                 logging.info(f"Foreign keys for table 'orders_table': {foreign_keys}")
 
+                succeeded = True
+
             except SQLAlchemyError as e:
                 logging.error(f"An error occurred: {e}")
 
+    # swap the fully built tables into place, only once casting and keys have succeeded
+    if schema and succeeded:
+        instance.swap_shadow_schema()
+
     logging.info('End of call')
 
-run_all_operations()
\ No newline at end of file
+if __name__ == '__main__':
+    run_all_operations()
\ No newline at end of file
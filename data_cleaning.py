@@ -3,6 +3,7 @@ import logging
 import numpy as np
 import re 
 import os 
+import functools
 from dotenv import load_dotenv
 from IPython.display import display
 from sqlalchemy import MetaData, Table
@@ -13,16 +14,425 @@ from dateutil import parser
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# the columns of the S3 feeds that the cleaning methods use, so that only these are decoded 
+# when the feeds are published in a columnar format (Parquet / Feather)
+PRODUCTS_COLUMNS = ['product_name', 'product_price', 'weight', 'category', 'EAN', 'date_added', 'uuid', 'removed', 'product_code']
+DATE_EVENTS_COLUMNS = ['timestamp', 'month', 'year', 'day', 'time_period', 'date_uuid']
+
+# the low-cardinality columns of each source that are kept as categoricals while cleaning
+LEGACY_USERS_CATEGORIES = ['country_code', 'country']
+CARD_DETAILS_CATEGORIES = ['card_provider']
+STORE_DETAILS_CATEGORIES = ['country_code', 'continent', 'store_type']
+PRODUCTS_CATEGORIES = ['category', 'removed']
+DATE_EVENTS_CATEGORIES = ['time_period']
+
+# free text and IDs are kept as Arrow-backed strings, or pandas' own strings if pyarrow isn't installed
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = 'string'
+
+
+def optimize_dtypes(df, categories=(), exclude=()):
+    """
+    Converts a freshly extracted dataframe to compact dtypes: the listed low-cardinality columns to 
+    category, the other text columns to STRING_DTYPE, and integers to the smallest type that holds them.
+
+    Args:
+        df (pd.DataFrame): The extracted dataframe.
+        categories (list, optional): The columns to convert to category. Defaults to ().
+        exclude (list, optional): The columns to leave as they are, e.g. mixed type columns. Defaults to ().
+
+    Returns:
+        pd.DataFrame: The dataframe with compact dtypes.
+    """
+    memory_before = df.memory_usage(deep=True).sum()
+
+    conversions = {}
+    for column in df.columns:
+        if column in exclude:
+            continue
+        if column in categories:
+            conversions[column] = 'category'
+        elif df[column].dtype == object:
+            conversions[column] = STRING_DTYPE
+    df = df.astype(conversions)
+
+    for column in df.select_dtypes('integer').columns:
+        if column not in exclude:
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    memory_after = df.memory_usage(deep=True).sum()
+    logging.info(f"Optimized dtypes from {memory_before / 1e6:.1f} MB to {memory_after / 1e6:.1f} MB")
+
+    return df
+
+# the unambiguous date formats found in the sources, tried in order before falling back to dateutil
+DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y %B %d', '%B %Y %d']
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_date_flexible(date_str):
+    """
+    Parses a date string with dateutil, returning it as YYYY-MM-DD or None if it isn't a date.
+    """
+    try:
+        return parser.parse(date_str).strftime('%Y-%m-%d')
+    except (parser.ParserError, ValueError, TypeError, OverflowError):
+        return None
+
+
+def normalize_dates(series, formats=DATE_FORMATS):
+    """
+    Converts a column of date strings in mixed formats to YYYY-MM-DD strings. Each distinct value 
+    is parsed once: the known formats are tried with vectorized pd.to_datetime first, and only 
+    the values none of them match are passed to the (slow) dateutil parser.
+
+    Args:
+        series (pd.Series): The column of date strings.
+        formats (list, optional): The strptime formats to try before dateutil. Defaults to DATE_FORMATS.
+
+    Returns:
+        tuple: The YYYY-MM-DD strings (NaN where the value isn't a date), and a boolean mask of the 
+        rejected rows.
+    """
+    # parse each distinct value once and map the results back with the codes
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.Series(np.nan, index=uniques.index, dtype=object)
+
+    for date_format in formats:
+        remaining = parsed.isna()
+        if not remaining.any():
+            break
+        dates = pd.to_datetime(uniques[remaining], format=date_format, errors='coerce')
+        matched = dates.notna()
+        parsed[dates.index[matched]] = dates[matched].dt.strftime('%Y-%m-%d')
+
+    # fall back to dateutil for the values that didn't match any of the known formats
+    remaining = parsed.isna()
+    parsed[remaining] = uniques[remaining].map(_parse_date_flexible)
+
+    result = pd.Series(parsed.to_numpy()[codes], index=series.index, dtype=object)
+    result[codes == -1] = np.nan
+    rejected = result.isna()
+
+    logging.info(f"Normalized {len(series)} dates ({len(uniques)} distinct), rejected {int(rejected.sum())}")
+
+    return result, rejected
+
+
+# conversion factors from the weight units in the products data to kg
+WEIGHT_CONVERSION_FACTORS = {
+    'kg': 1,
+    'g': 0.001,
+    'oz': 0.0283495231,
+    'ml': 0.001  # Assuming ml is equivalent to grams for water-based products
+}
+
+
+def convert_weights_to_kg(weights, conversion_factors=WEIGHT_CONVERSION_FACTORS):
+    """
+    Converts a column of weights such as '500g' or '12 x 100g' to kg in one vectorized pass.
+
+    Args:
+        weights (pd.Series): The column of weights.
+        conversion_factors (dict, optional): Factors from each unit to kg. Defaults to WEIGHT_CONVERSION_FACTORS.
+
+    Returns:
+        pd.Series: The weights in kg, 0 for unknown units and NaN where the weight can't be read.
+    """
+    weights = weights.astype(str)
+
+    # '<number><unit>' (e.g. '1.6kg'), and '<n> x <amount><unit>' (e.g. '12 x 100g')
+    single = weights.str.extract(r'^([0-9.]+)([a-zA-Z]+)')
+    multiple = weights.str.extract(r'^(\d+)\s*x\s*(\d+)([a-zA-Z]+)$')
+
+    single_factor = single[1].str.lower().map(conversion_factors).fillna(0).to_numpy(dtype=float)
+    multiple_factor = multiple[2].str.lower().map(conversion_factors).fillna(0).to_numpy(dtype=float)
+
+    single_kg = pd.to_numeric(single[0], errors='coerce').to_numpy(dtype=float) * single_factor
+    multiple_kg = (pd.to_numeric(multiple[0], errors='coerce').to_numpy(dtype=float)
+                   * pd.to_numeric(multiple[1], errors='coerce').to_numpy(dtype=float)
+                   * multiple_factor)
+
+    # the single weight takes precedence, as in the order the shapes are checked in
+    kg = np.where(single[0].notna().to_numpy(), single_kg, multiple_kg)
+
+    return pd.Series(kg, index=weights.index, dtype=float)
+
+
+def _map_unique(series, func, dtype=None):
+    """
+    Applies a function to each distinct value of a column once and maps the results back to the 
+    rows, so the cost scales with the number of distinct values rather than rows.
+
+    Args:
+        series (pd.Series): The column to map.
+        func (callable): The function to apply to each distinct value (and once to NaN, if any values are missing).
+        dtype (optional): The dtype of the result. Defaults to the column's dtype for categorical and 
+            string columns.
+
+    Returns:
+        pd.Series: The results, aligned with the column.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+        dtype = dtype or 'category'
+    else:
+        codes, uniques = pd.factorize(series)
+        if isinstance(series.dtype, pd.StringDtype):
+            dtype = dtype or series.dtype
+
+    # the result for missing values goes last, where the -1 code of a missing value points
+    values = np.empty(len(uniques) + 1, dtype=object)
+    values[:-1] = [func(value) for value in uniques]
+    values[-1] = func(np.nan) if (codes == -1).any() else np.nan
+
+    result = pd.Series(values[codes], index=series.index)
+    return result.astype(dtype) if dtype else result.infer_objects()
+
+
+def _normalize_text_value(value):
+    if not isinstance(value, str):
+        return value
+    value = value.lower().strip()
+    # unidecode leaves ASCII text unchanged, so only non-ASCII text is transliterated
+    return value if value.isascii() else unidecode(value)
+
+
+def normalize_text(series):
+    """
+    Converts a text column to lower case, strips whitespace and transliterates special characters 
+    to ASCII with unidecode, once per distinct value.
+
+    Args:
+        series (pd.Series): The text column.
+
+    Returns:
+        pd.Series: The normalized text.
+    """
+    return _map_unique(series, _normalize_text_value)
+
+
+# the (shortest, longest) card number lengths of each card provider
+CARD_NUMBER_LENGTHS = {
+    'VISA 13 digit': (13, 13),
+    'VISA 16 digit': (16, 16),
+    'VISA 19 digit': (19, 19),
+    'JCB 15 digit': (15, 15),
+    'JCB 16 digit': (16, 16),
+    'American Express': (15, 15),
+    'Diners Club / Carte Blanche': (14, 14),
+    'Mastercard': (16, 16),
+    'Discover': (16, 16),
+    'Maestro': (12, 19)
+}
+
+
+def validate_card_numbers(card_numbers, card_providers, strict=True):
+    """
+    Validates card numbers in vectorized passes: that they are digits only, and (if strict) that 
+    their length matches the card provider and that they pass the Luhn checksum.
+
+    Args:
+        card_numbers (pd.Series): The card numbers, as strings.
+        card_providers (pd.Series): The card provider of each card number.
+        strict (bool, optional): Whether to check the lengths and checksums. Defaults to True.
+
+    Returns:
+        tuple: A boolean mask of the card numbers to keep, and the reason each rejected card number 
+        was rejected ('format', 'length' or 'checksum', None for the ones kept).
+    """
+    card_numbers = card_numbers.astype(str)
+    reasons = np.full(len(card_numbers), None, dtype=object)
+
+    # STEP 1: digits only 
+    keep = card_numbers.str.fullmatch(r'[0-9]+').fillna(False).to_numpy(dtype=bool, copy=True)
+    reasons[~keep] = 'format'
+
+    if strict:
+        # STEP 2: the length allowed for the card provider (unknown providers allow no length)
+        lengths = card_numbers.str.len().to_numpy(dtype=float)
+        providers = card_providers.astype(object)
+        shortest = providers.map({provider: length[0] for provider, length in CARD_NUMBER_LENGTHS.items()}).to_numpy(dtype=float)
+        longest = providers.map({provider: length[1] for provider, length in CARD_NUMBER_LENGTHS.items()}).to_numpy(dtype=float)
+        valid_length = (lengths >= shortest) & (lengths <= longest)
+        reasons[keep & ~valid_length] = 'length'
+        keep &= valid_length
+
+        # STEP 3: the Luhn checksum, over a matrix of the digits right-aligned with leading zeros
+        if keep.any():
+            digits = card_numbers[keep]
+            width = int(digits.str.len().max())
+            matrix = (np.frombuffer(''.join(digits.str.zfill(width)).encode('ascii'), dtype=np.uint8)
+                      .reshape(-1, width).astype(np.int64) - ord('0'))
+
+            # double every second digit from the right, subtracting 9 from results over 9
+            doubled = matrix[:, -2::-2] * 2
+            matrix[:, -2::-2] = doubled - 9 * (doubled > 9)
+
+            valid_checksum = np.zeros(len(card_numbers), dtype=bool)
+            valid_checksum[keep] = matrix.sum(axis=1) % 10 == 0
+            reasons[keep & ~valid_checksum] = 'checksum'
+            keep &= valid_checksum
+
+    reasons = pd.Series(reasons, index=card_numbers.index, dtype=object)
+    logging.info(f"Card validation kept {int(keep.sum())} of {len(keep)} card numbers, rejected: {reasons.value_counts().to_dict()}")
+
+    return pd.Series(keep, index=card_numbers.index), reasons
+
+
+# the cleaning rules of each source, as a list of {'column', 'rule', **parameters}:
+# - 'replace' (mapping): replaces whole values
+# - 'remove_chars' (chars): removes the characters from the values
+# - 'match' (pattern): keeps the rows where the value matches the regex
+# - 'not_contains' (pattern): keeps the rows where the regex isn't found in the value
+# - 'isin' / 'not_in' (values): keeps the rows where the value is / isn't one of the values
+# - 'date': converts the dates to YYYY-MM-DD and keeps the rows with valid dates
+# the checks accept an optional 'exempt' list of index labels that are always kept
+CARD_DETAILS_RULES = [
+    {'column': 'expiry_date', 'rule': 'match', 'pattern': r'^\d{2}/\d{2}$'},
+    {'column': 'card_number', 'rule': 'remove_chars', 'chars': '?'},
+    {'column': 'date_payment_confirmed', 'rule': 'date'},
+    {'column': 'card_provider', 'rule': 'isin', 'values': ['Diners Club / Carte Blanche', 'American Express', 'JCB 16 digit', 'JCB 15 digit', 'Maestro', 'Mastercard', 'Discover', 'VISA 19 digit', 'VISA 16 digit', 'VISA 13 digit']}
+]
+
+STORE_DETAILS_RULES = [
+    {'column': 'lat', 'rule': 'not_contains', 'pattern': r'^[A-Za-z0-9]+$'},
+    {'column': 'lat', 'rule': 'not_in', 'values': ['NULL']},
+    {'column': 'continent', 'rule': 'replace', 'mapping': {'eeEurope': 'Europe', 'eeAmerica': 'America'}},
+    {'column': 'locality', 'rule': 'match', 'pattern': r'^[a-zA-Z\s-]+$', 'exempt': [0]},  # the webstore
+    {'column': 'locality', 'rule': 'not_in', 'values': ['NULL']},
+    {'column': 'opening_date', 'rule': 'date'}
+]
+
+PRODUCTS_RULES = [
+    {'column': 'removed', 'rule': 'replace', 'mapping': {'Still_avaliable': 'Still_available'}},
+    {'column': 'removed', 'rule': 'isin', 'values': ['Still_available', 'Removed']},
+    {'column': 'category', 'rule': 'match', 'pattern': r'^[a-zA-Z\-]+$'},
+    {'column': 'date_added', 'rule': 'date'}
+]
+
+
+class CleaningPlan:
+    """
+    A list of cleaning rules compiled into vectorized operations. The rules are grouped by column: 
+    the transforms of a column run first, in order, then all of its checks are fused into one 
+    predicate (the regexes combined into a single pattern) that is evaluated once per distinct 
+    value. The rows that fail any check are dropped with a single filter at the end.
+
+    Attributes:
+        steps (list): The compiled (column, kind, operation) steps, in order.
+    """
+
+    TRANSFORMS = ('replace', 'remove_chars')
+    CHECKS = ('match', 'not_contains', 'isin', 'not_in')
+
+    def __init__(self, rules):
+        columns = {}
+        for rule in rules:
+            if rule['rule'] not in self.TRANSFORMS + self.CHECKS + ('date',):
+                raise ValueError(f"Unsupported cleaning rule: {rule['rule']}")
+            columns.setdefault(rule['column'], []).append(rule)
+
+        self.steps = []
+        for column, column_rules in columns.items():
+            for rule in column_rules:
+                if rule['rule'] in self.TRANSFORMS:
+                    self.steps.append((column, 'transform', self._compile_transform(rule)))
+                elif rule['rule'] == 'date':
+                    self.steps.append((column, 'date', None))
+
+            # fuse the checks of the column, separately for each set of exempt rows
+            checks = {}
+            for rule in column_rules:
+                if rule['rule'] in self.CHECKS:
+                    checks.setdefault(tuple(rule.get('exempt', ())), []).append(rule)
+            for exempt, exempt_rules in checks.items():
+                self.steps.append((column, 'check', (self._compile_check(exempt_rules), list(exempt))))
+
+    @staticmethod
+    def _compile_transform(rule):
+        if rule['rule'] == 'replace':
+            mapping = rule['mapping']
+            return lambda value: mapping.get(value, value) if isinstance(value, str) else value
+
+        table = str.maketrans('', '', rule['chars'])
+        return lambda value: value.translate(table) if isinstance(value, str) else value
+
+    @staticmethod
+    def _compile_check(rules):
+        # all the regexes a value must match, as lookaheads from the start of the value
+        match_patterns = [rule['pattern'] for rule in rules if rule['rule'] == 'match']
+        matches = re.compile(''.join(f"(?={pattern})" for pattern in match_patterns)) if match_patterns else None
+
+        # all the regexes a value mustn't contain, as one alternation
+        contains_patterns = [rule['pattern'] for rule in rules if rule['rule'] == 'not_contains']
+        contains = re.compile('|'.join(f"(?:{pattern})" for pattern in contains_patterns)) if contains_patterns else None
+
+        allowed = [set(rule['values']) for rule in rules if rule['rule'] == 'isin']
+        excluded = set().union(*[rule['values'] for rule in rules if rule['rule'] == 'not_in'])
+
+        def check(value):
+            is_text = isinstance(value, str)
+            if matches and not (is_text and matches.match(value)):
+                return False
+            if contains and is_text and contains.search(value):
+                return False
+            if any(value not in values for values in allowed) or value in excluded:
+                return False
+            return True
+
+        return check
+
+    def apply(self, df):
+        """
+        Applies the plan to a dataframe.
+
+        Args:
+            df (pd.DataFrame): The dataframe to clean. Its columns are transformed in place.
+
+        Returns:
+            pd.DataFrame: The cleaned dataframe, with the rows that failed a check dropped.
+        """
+        keep = np.ones(len(df), dtype=bool)
+
+        for column, kind, operation in self.steps:
+            if kind == 'transform':
+                df[column] = _map_unique(df[column], operation)
+            elif kind == 'date':
+                df[column], rejected = normalize_dates(df[column])
+                keep &= ~rejected.to_numpy()
+            else:
+                check, exempt = operation
+                passed = _map_unique(df[column], check, dtype=bool).to_numpy()
+                if exempt:
+                    passed = passed | df.index.isin(exempt)
+                keep &= passed
+
+        logging.info(f"Cleaning rules kept {int(keep.sum())} of {len(df)} rows")
+
+        return df[keep]
+
 class DataCleaning: 
     
     """
     This class contains methods to clean data extracted using methods from the DataExtractor class.
 
+    The methods chained on 'legacy_users' don't copy the frame at every filter: each filter ANDs its 
+    mask into a pending one, transforms only touch the rows still kept, and the frame is filtered 
+    once when 'df' is next read.
+
     Attributes:
         df (pd.DataFrame): Used for chaining cleaning methods on the 'legacy_users' data.
         pdf_path (str): Path to the PDF file for extracting data.
         s3_dates_url (str): URL for the S3 bucket containing dates data.
         s3_products_url (str): URL for the S3 bucket containing products data.  
+        strict_card_validation (bool): Whether card numbers are checked against their provider's length and the Luhn checksum.
+        rejected_cards (pd.DataFrame): The card details rows dropped by the card number checks, with the 'reason' 
+            each was rejected, or None before clean_card_data has run.
     
     """
     
@@ -45,6 +455,11 @@ class DataCleaning:
             self.pdf_path = os.getenv('PDF_PATH')
             self.s3_dates_url = os.getenv('S3_DATES_URL') 
             self.s3_products_url = os.getenv('S3_PRODUCTS_URL')
+
+            # whether card numbers are checked against their provider's length and the Luhn checksum
+            # (off by default: orders whose card is rejected would break the foreign key added by data_casting.py)
+            self.strict_card_validation = os.getenv('STRICT_CARD_VALIDATION', 'false').lower() == 'true'
+            self.rejected_cards = None
     
         except ValueError as ve:
             logging.error(f"Error loading environment variables: {ve}")
@@ -53,6 +468,59 @@ class DataCleaning:
             logging.error(f"An unexpected error occurred: {e}")
             raise 
 
+    @property
+    def df(self):
+        """
+        The chained dataframe, with the pending filters applied.
+        """
+        if self._mask is not None:
+            self._frame = self._frame[self._mask]
+            self._mask = None
+        return self._frame
+
+    @df.setter
+    def df(self, value):
+        self._frame = value
+        self._mask = None
+
+    def _column(self, column):
+        """
+        Returns a column of the rows that haven't been filtered out.
+        """
+        series = self._frame[column]
+        return series if self._mask is None else series[self._mask]
+
+    def _set_column(self, column, values):
+        """
+        Sets a column of the rows that haven't been filtered out.
+        """
+        if self._mask is None:
+            self._frame[column] = values
+            return
+
+        current = self._frame[column]
+        if isinstance(current.dtype, pd.CategoricalDtype):
+            # the new values may not be categories of the column yet, so add them before setting the rows
+            values = np.asarray(values, dtype=object)
+            new_values = pd.Index(pd.unique(values[pd.notna(values)]))
+            categories = current.cat.categories.union(new_values.difference(current.cat.categories), sort=False)
+            self._frame[column] = current.cat.set_categories(categories)
+            values = pd.Categorical(values, dtype=self._frame[column].dtype)
+
+        self._frame.loc[self._mask, column] = values
+
+    def _filter(self, keep):
+        """
+        Registers a boolean mask of which of the rows that haven't been filtered out to keep.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        if self._mask is None:
+            self._mask = keep
+        else:
+            mask = self._mask.copy()
+            mask[mask] = keep
+            self._mask = mask
+
     def drop_null_values_and_duplicates(self): 
 
         """
@@ -70,13 +538,17 @@ class DataCleaning:
         # Create an instance of DataExtractor
         instance = DataExtractor()
 
-        # Read data from the 'legacy_users' table using the DataExtractor method 
-        self.df = instance.read_data_from_table('legacy_users')  
+        # Read data from the 'legacy_users' table using the DataExtractor method, with the NULL 
+        # rows and duplicates filtered out by RDS so they aren't transferred
+        self.df = instance.read_data_from_table('legacy_users', filters=[('*', 'not_null', 'NULL')], distinct=True)  
 
         # Drop rows with any NaN values
         self.df.replace('NULL', np.nan, inplace=True)
         self.df.dropna(inplace=True)
 
+        # Convert to compact dtypes for the rest of the cleaning 
+        self.df = optimize_dtypes(self.df, categories=LEGACY_USERS_CATEGORIES)
+
         # Drop the duplicates from the dataframe directly ('in place')  
         self.df = self.df.drop_duplicates()
 
@@ -99,7 +571,7 @@ class DataCleaning:
         logging.info('clean_country_codes is working')
 
         # replace 'GGB' with 'GB' in the 'country_code' column of the cleaned_country_names_and_codes_df
-        self.df['country_code'] = self.df['country_code'].replace('GGB', 'GB')
+        self._set_column('country_code', _map_unique(self._column('country_code'), lambda code: 'GB' if code == 'GGB' else code))
 
         #return the cleaned df 
         return self
@@ -122,7 +594,7 @@ class DataCleaning:
         regex_country_code = '^[A-Z]{2}$'
 
         # Apply the regex
-        self.df = self.df[self.df['country_code'].str.match(regex_country_code)] 
+        self._filter(self._column('country_code').str.match(regex_country_code, na=False))
 
         return self 
 
@@ -145,7 +617,7 @@ class DataCleaning:
         pattern = r'^[a-zA-Z\s-]+$'
 
         # Filter the data frame to only contain items that match the regex  
-        self.df = self.df[self.df['country'].str.match(pattern)] 
+        self._filter(self._column('country').str.match(pattern, na=False))
    
         #return the cleaned dataframe 
         return self
@@ -165,17 +637,9 @@ class DataCleaning:
 
         logging.info('clean_text_fields is working')
 
-        #convert first_name and last_name to lower case 
-        self.df['first_name'] = self.df['first_name'].str.lower()
-        self.df['last_name'] = self.df['last_name'].str.lower()
-
-        # Strip whitespace from first_name and last_name fields
-        self.df['first_name'] = self.df['first_name'].str.strip()
-        self.df['last_name'] = self.df['last_name'].str.strip()
-
-        # Remove special characters using unidecode
-        self.df['first_name'] = self.df['first_name'].apply(unidecode)
-        self.df['last_name'] = self.df['last_name'].apply(unidecode)
+        for column in ['first_name', 'last_name']:
+            # convert to lower case, strip whitespace and remove special characters using unidecode
+            self._set_column(column, normalize_text(self._column(column)))
 
          # return the cleaned df 
         return self
@@ -196,38 +660,23 @@ class DataCleaning:
 
         logging.info('clean_dob_and_join_date method is working')
 
-        # STEP 1: Define the converting function
+        # STEP 1: cleaning date_of_birth 
 
-        # Initialize a list to store invalid dates
-        invalid_dates_list = []
+        # Convert the 'date_of_birth' column to YYYY-MM-DD
+        dates, rejected = normalize_dates(self._column('date_of_birth'))
+        self._set_column('date_of_birth', dates)
 
-        # Define a function to parse dates and standardize format that can be applied to date_of_birth and join_date
-        def parse_date(date_str):
-            try:
-                # Attempt to parse the date string to a datetime object
-                dt = parser.parse(date_str)
-                # Convert to the desired format (YYYY-MM-DD)
-                return dt.strftime('%Y-%m-%d')
-            except (parser.ParserError, ValueError):
-                # Append invalid date to the list
-                invalid_dates_list.append(date_str)
-                return np.nan  # Return NaN for invalid dates
+        # Drop rows with invalid dates
+        self._filter(~rejected)
 
-        # STEP 2: cleaning date_of_birth 
+        # STEP 2: clean join date 
 
-        # Apply the function to the 'date_of_birth' column
-        self.df['date_of_birth'] = self.df['date_of_birth'].apply(parse_date)
+        # Convert the 'join_date' column to YYYY-MM-DD
+        dates, rejected = normalize_dates(self._column('join_date'))
+        self._set_column('join_date', dates)
 
-        # Drop rows with NaN (invalid dates)
-        self.df = self.df.dropna(subset=['date_of_birth'])
-
-        # STEP 3: clean join date 
-
-        # Apply the function to the 'date_of_birth' column
-        self.df['join_date'] = self.df['join_date'].apply(parse_date)
-
-        # Drop rows with NaN (invalid dates)
-        self.df = self.df.dropna(subset=['join_date'])
+        # Drop rows with invalid dates
+        self._filter(~rejected)
 
         # return cleaned df 
         return self
@@ -259,7 +708,7 @@ class DataCleaning:
         """
         Cleans card data retrieved from a PDF, including:
         - 'expiry_date' column: Removes incorrect values and converts to datetime.
-        - 'card_number' column: Cleans with regex.
+        - 'card_number' column: Removes '?' and validates the digits, length and Luhn checksum.
         - 'date_payment_confirmed' column: Converts to datetime.
         - 'card_provider' column: Removes invalid providers.
 
@@ -278,71 +727,31 @@ class DataCleaning:
         # Read data from the card details pdf
         df = instance.retrieve_pdf_data(self.pdf_path)
 
-        # STEP 1: Cleaning expiry date column
-
-        logging.info('started cleaning expiry date column')
-
-        # Define a regular expression pattern for the MM/YY format
-        pattern_exp = r'^\d{2}/\d{2}$'
+        # Convert to compact dtypes for the rest of the cleaning 
+        df = optimize_dtypes(df, categories=CARD_DETAILS_CATEGORIES)
 
-        # Use str.match to filter rows where 'expiry_date' matches the pattern
-        df = df[df['expiry_date'].str.match(pattern_exp)].reset_index(drop=True)
+        # STEP 1: Apply the card details rules (MM/YY expiry dates, card numbers with the '??' 
+        # removed, valid payment dates and valid card providers)
 
-        # Convert expiry_date to datetime, coerce errors to NaT using .loc to avoid SettingWithCopyWarning
-        df.loc[:, 'datetime_expiry_date'] = pd.to_datetime(df['expiry_date'], format='%m/%y', errors='coerce')
-
-        # Reset the index
-        df = df.reset_index(drop=True)
-
-        # STEP 2: Cleaning card number
-        
-        # Define a regular expression pattern for numbers only
-        pattern_card = r'^\d+$'
-   
         # Ensure all elements in the 'card_number' column are strings
         df['card_number'] = df['card_number'].astype(str)
 
-        # Remove '??' from the strings in the 'card_number' column
-        df['card_number'] = df['card_number'].str.replace('?', '', regex=False)
+        df = CleaningPlan(CARD_DETAILS_RULES).apply(df)
 
-        # Use apply with a lambda function to filter rows where 'card_number' matches the pattern
-        df = df[df['card_number'].apply(lambda x: bool(re.match(pattern_card, x)))].reset_index(drop=True)
+        # STEP 2: Keep the digits only card numbers, which (unless STRICT_CARD_VALIDATION is 'false') 
+        # also have the provider's length and a valid Luhn checksum
+        keep, reasons = validate_card_numbers(df['card_number'], df['card_provider'], strict=self.strict_card_validation)
 
-        # STEP 3: Cleaning date_payment_confirmed
-        
-        # Initialize a list to store invalid dates
-        invalid_dates_list = []
+        # keep the rejected rows and why they were rejected, so they can be checked against the orders
+        self.rejected_cards = df[~keep].assign(reason=reasons[~keep]).reset_index(drop=True)
+        if not self.rejected_cards.empty:
+            logging.warning(f"Rejected {len(self.rejected_cards)} card numbers: "
+                            f"{self.rejected_cards['card_number'].head(20).tolist()}")
 
-        # Function to parse dates and standardize format
-        def parse_date(date_str):
-            try:
-                # Attempt to parse the date string to a datetime object
-                dt = parser.parse(date_str)
-                # Convert to the desired format (YYYY-MM-DD)
-                return dt.strftime('%Y-%m-%d')
-            except (parser.ParserError, ValueError):
-                # Append invalid date to the list
-                invalid_dates_list.append(date_str)
-                return np.nan  # Return NaN for invalid dates
+        df = df[keep].reset_index(drop=True)
 
-        # Apply the function to the 'date_payment_confirmed' column
-        df.loc[:, 'date_payment_confirmed'] = df['date_payment_confirmed'].apply(parse_date)
-
-        # Drop rows with NaN in 'date_payment_confirmed'
-        df = df.dropna(subset=['date_payment_confirmed'])
-
-        # STEP 4: removing incorrect values from the card providers column 
-
-        logging.info('started removing incorrect values from card providers column')
-
-        # Create a valid providers list  
-        valid_providers = ['Diners Club / Carte Blanche', 'American Express', 'JCB 16 digit','JCB 15 digit', 'Maestro', 'Mastercard', 'Discover','VISA 19 digit', 'VISA 16 digit', 'VISA 13 digit']
-
-        # Filter the DataFrame to keep only rows with valid card providers
-        df = df[df['card_provider'].isin(valid_providers)]
-
-        #Reset the index of the filtered DataFrame
-        df = df.reset_index(drop=True)
+        # STEP 3: Convert expiry_date to datetime, coerce errors to NaT
+        df['datetime_expiry_date'] = pd.to_datetime(df['expiry_date'], format='%m/%y', errors='coerce')
 
         return df
 
@@ -385,16 +794,15 @@ class DataCleaning:
         df.loc[index_to_update, 'locality'] = 'online'
         df.loc[index_to_update, 'latitude'] = 1
 
-        # STEP 2 remove garbage records and NULL from lat 
-
-        # Define the regex pattern to match invalid lat values
-        pattern = r'^[A-Za-z0-9]+$'
+        # Convert to compact dtypes for the rest of the cleaning, leaving the coordinates (which now 
+        # mix numbers and text) as they are
+        df = optimize_dtypes(df, categories=STORE_DETAILS_CATEGORIES, exclude=['longitude', 'lat', 'latitude'])
 
-        # Create a boolean mask for rows to keep: rows that do not match the pattern and are not 'NULL'
-        mask = ~df['lat'].str.contains(pattern, na=False) & ~df['lat'].isin(['NULL'])
+        # STEP 2 apply the store details rules: remove garbage records and NULL from lat, replace 
+        # incorrect spellings of continents, filter out items in locality that aren't real place names 
+        # or NULL (apart from the webstore), and convert opening_date to YYYY-MM-DD 
 
-        # Filter the DataFrame using the mask
-        df = df[mask]
+        df = CleaningPlan(STORE_DETAILS_RULES).apply(df)
 
         # STEP 3 cleaning staff numbers
 
@@ -407,55 +815,9 @@ class DataCleaning:
         # Apply the function to clean the staff_numbers column
         df['staff_numbers'] = df['staff_numbers'].apply(clean_staff_numbers)
 
-        # Convert the cleaned staff_numbers column to integer
-        df['staff_numbers'] = df['staff_numbers'].astype(int)
-
-        # STEP 4: cleaning continents 
-
-        # replacing incorrect spellings of continents 
-        continent_replacements = {
-            'eeEurope': 'Europe',
-            'eeAmerica': 'America'
-        }
+        # Convert the cleaned staff_numbers column to the smallest integer type
+        df['staff_numbers'] = pd.to_numeric(df['staff_numbers'].astype(int), downcast='integer')
 
-        df['continent'] = df['continent'].replace(continent_replacements)
-
-        # STEP 5, cleaning locality 
-
-        # filtering out items in locality that aren't real place names or NULL 
-        pattern = r'^[a-zA-Z\s-]+$'
-        locality_mask = df['locality'].str.match(pattern, na=False) | (df.index == 0)
-
-        # Apply the locality mask
-        df = df[locality_mask]
-
-        # Replace 'NULL' with np.nan and drop rows where 'locality' is NaN
-        df['locality'] = df['locality'].replace('NULL', np.nan)
-        df = df.dropna(subset=['locality'])
-
-        # STEP 6, Converting opening_date to datetime  
-
-        # Initialize a list to store invalid dates
-        invalid_dates_list = []
-
-        # Function to parse dates and standardize format
-        def parse_date(date_str):
-            try:
-                # Attempt to parse the date string to a datetime object
-                dt = parser.parse(date_str)
-                # Convert to the desired format (YYYY-MM-DD)
-                return dt.strftime('%Y-%m-%d')
-            except (parser.ParserError, ValueError):
-                # Append invalid date to the list
-                invalid_dates_list.append(date_str)
-                return np.nan  # Return NaN for invalid dates
-
-        # Apply the function to the 'date_of_birth' column
-        df['opening_date'] = df['opening_date'].apply(parse_date)
-
-        # Drop rows with NaN (invalid dates)
-        df = df.dropna(subset=['opening_date'])
-       
         return df 
 
 
@@ -482,95 +844,24 @@ class DataCleaning:
         instance = DataExtractor()
             
         # retrieving the data from the stores API
-        df = instance.extract_from_s3(self.s3_products_url) 
+        df = instance.extract_from_s3(self.s3_products_url, columns=PRODUCTS_COLUMNS) 
+
+        # Convert to compact dtypes for the rest of the cleaning 
+        df = optimize_dtypes(df, categories=PRODUCTS_CATEGORIES)
        
         # STEP 1: Add column with weights in kg 
 
-        # Define the regex pattern to match numbers and letters
-        weight_pattern = re.compile(r'([0-9.]+)([a-zA-Z]+)')
-
-        # Define the regex pattern to match the weight multiplier format
-        weight_multiplier = re.compile(r'^(\d+)\s*x\s*(\d+)([a-zA-Z]+)$')
-
-        # Conversion factors to kg
-        conversion_factors = {
-            'kg': 1,
-            'g': 0.001,
-            'oz': 0.0283495231,
-            'ml': 0.001  # Assuming ml is equivalent to grams for water-based products
-        }
-
-        def convert_to_kg(weight):
-            if pd.isna(weight):
-                return None  # Handle NaN values
-            
-            match1 = weight_pattern.match(str(weight))
-            match2 = weight_multiplier.match(str(weight))
-            
-            if match1:
-                number = float(match1.group(1))  # Extract the numeric part
-                unit = match1.group(2).lower()  # Extract the unit part
-                return number * conversion_factors.get(unit, 0)  # Convert to kg
-            
-            elif match2:
-                multiplier = int(match2.group(1))  # Get the multiplier
-                amount = float(match2.group(2))  # Extract the amount
-                unit = match2.group(3).lower()  # Extract the unit
-                return (multiplier * amount) * conversion_factors.get(unit, 0)  # Convert to kg
-            
-            return None  # Handle cases where regex does not match
-
-        # Apply the conversion to the 'weight' column
-        df['weight_in_kg'] = df['weight'].apply(convert_to_kg)
-
-        # STEP 2: Clean mispelt values
-
-        # Correct the misspelled value
-        df['removed'] = df['removed'].str.replace('Still_avaliable', 'Still_available')
+        df['weight_in_kg'] = convert_weights_to_kg(df['weight'])
 
-        # Define valid values
-        valid_values = ['Still_available', 'Removed']
+        # STEP 2: Apply the products rules (correct the misspelled 'removed' value and keep only 
+        # 'Still_available' or 'Removed', filter the 'category' column with regex, and convert 
+        # date_added to YYYY-MM-DD)
 
-        # Filter the DataFrame to keep only 'Still_available' or 'Removed'
-        df = df[df['removed'].isin(valid_values)]
+        df = CleaningPlan(PRODUCTS_RULES).apply(df)
 
         # Drop rows with NaN values
         df = df.dropna(axis=0)
 
-        # STEP 3: Clean 'category' column 
-
-        # Define the regex pattern for the 'category' column
-        category_pattern = re.compile(r'^[a-zA-Z\-]+$')
-
-        # Capture rows that will be dropped by the category filter
-        rows_dropped_by_category = df[~df['category'].apply(lambda x: bool(category_pattern.match(str(x))))]
-
-        # Filter rows based on the category pattern
-        df = df[df['category'].apply(lambda x: bool(category_pattern.match(str(x))))]
-
-        # STEP 4: convert date_added to datetime object 
-
-        # Initialize a list to store invalid dates
-        invalid_dates_list = []
-
-        # Function to parse dates and standardize format
-        def parse_date(date_str):
-            try:
-                # Attempt to parse the date string to a datetime object
-                dt = parser.parse(date_str)
-                # Convert to the desired format (YYYY-MM-DD)
-                return dt.strftime('%Y-%m-%d')
-            except (parser.ParserError, ValueError):
-                # Append invalid date to the list
-                invalid_dates_list.append(date_str)
-                return np.nan  # Return NaN for invalid dates
-
-        # Apply the function to the 'date_of_birth' column
-        df['date_added'] = df['date_added'].apply(parse_date)
-
-        # Drop rows with NaN (invalid dates)
-        df = df.dropna(subset=['date_added'])
-
         return df 
 
     def clean_orders_data(self):
@@ -592,12 +883,13 @@ class DataCleaning:
         instance = DataExtractor()
         
         # get the 'orders_table' data via the 'read_data_from_table' method, and assign it to df 
-        df = instance.read_data_from_table('orders_table')
-        
-        # drop unwanted columns 
-        df = df.drop('1', axis=1)
-        df = df.drop('first_name', axis=1)
-        df = df.drop('last_name', axis=1)
+        # (read in parallel ranges if ORDERS_PARTITION_COLUMN is set, e.g. to 'index' or 'ctid')
+        # the unwanted columns are left out of the query, so they are never transferred from RDS 
+        df = instance.read_data_from_table('orders_table', partition_column=os.getenv('ORDERS_PARTITION_COLUMN'), 
+                                           exclude_columns=['1', 'first_name', 'last_name'])
+
+        # Convert the UUIDs and codes to Arrow strings and downcast product_quantity
+        df = optimize_dtypes(df)
         
         # return the cleaned df 
         return df 
@@ -622,13 +914,16 @@ class DataCleaning:
         instance = DataExtractor()
         
         # extract the 'date_events' data from the S3 resource 
-        df = instance.extract_from_s3(self.s3_dates_url)
+        df = instance.extract_from_s3(self.s3_dates_url, columns=DATE_EVENTS_COLUMNS)
+
+        # Convert to compact dtypes for the rest of the cleaning 
+        df = optimize_dtypes(df, categories=DATE_EVENTS_CATEGORIES)
         
         # define the regex pattern for cleaning the year 
         year_regex = r'^\d{4}$'
         
         # apply the regex pattern to clean the year 
-        df = df[df['year'].str.match(year_regex)]
+        df = df[df['year'].str.match(year_regex, na=False)]
 
         df['complete_timestamp'] = pd.to_datetime(df['year'] + '-' + df['month'] + '-' + df['day'] + ' ' + df['timestamp'], format='%Y-%m-%d %H:%M:%S')
 
@@ -638,61 +933,83 @@ class DataCleaning:
 
 # TESTING / CALLING CODE 
 
-#CREATING INSTANCES 
+# only run the pipeline when this file is run, not when it is imported (e.g. by the PDF worker processes)
+if __name__ == '__main__':
+    #CREATING INSTANCES 
 
-# creating data cleaning instance needed for running the methods in this class 
-datacleaning_instance = DataCleaning() 
+    # creating data cleaning instance needed for running the methods in this class 
+    datacleaning_instance = DataCleaning() 
 
-# creating database connector instance needed for running the methods in database_utils file  
-databaseconnector_instance = DatabaseConnector() 
+    # creating database connector instance needed for running the methods in database_utils file  
+    databaseconnector_instance = DatabaseConnector() 
 
-# dropping data bases 
-databaseconnector_instance.reset_database() 
- 
-# LEGACY USER DATA 
+    # dropping data bases, unless the tables are being upserted into (LOAD_MODE=upsert) 
+    # or rebuilt in the shadow schema and swapped in by data_casting.py (LOAD_MODE=shadow)
+    if databaseconnector_instance.load_mode == 'replace':
+        databaseconnector_instance.reset_database() 
+    elif databaseconnector_instance.load_mode == 'shadow':
+        databaseconnector_instance.prepare_shadow_schema()
+
+    # LEGACY USER DATA 
+
+    # fetching and cleaning legacy users data 
+    clean_legacy_users_df = datacleaning_instance.clean_legacy_users_data() 
+
+    # uploading legacy users data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_users' 
+    if not databaseconnector_instance.upload_to_db(clean_legacy_users_df, 'dim_users'):
+        raise SystemExit("Uploading 'dim_users' failed, see the log for the error")
 
-# fetching and cleaning legacy users data 
-clean_legacy_users_df = datacleaning_instance.clean_legacy_users_data() 
+    # CARD DATA 
 
-# uploading legacy users data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_users' 
-databaseconnector_instance.upload_to_db(clean_legacy_users_df, 'dim_users')
+    # fetching and cleaning card data 
+    clean_card_data_df = datacleaning_instance.clean_card_data() 
 
-# CARD DATA 
+    # uploading legacy users data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_users' 
+    if not databaseconnector_instance.upload_to_db(clean_card_data_df, 'dim_card_details'):
+        raise SystemExit("Uploading 'dim_card_details' failed, see the log for the error")
 
-# fetching and cleaning card data 
-clean_card_data_df = datacleaning_instance.clean_card_data() 
+    # STORE DETAILS 
 
-# uploading legacy users data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_users' 
-databaseconnector_instance.upload_to_db(clean_card_data_df, 'dim_card_details')
+    # fetching and cleaning card data 
+    clean_store_data_df = datacleaning_instance.cleaning_store_details()
 
-# STORE DETAILS 
+    # uploading store_details data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_store_details' 
+    if not databaseconnector_instance.upload_to_db(clean_store_data_df, 'dim_store_details'):
+        raise SystemExit("Uploading 'dim_store_details' failed, see the log for the error")
 
-# fetching and cleaning card data 
-clean_store_data_df = datacleaning_instance.cleaning_store_details()
+    # CLEAN PRODUCTS 
 
-# uploading store_details data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'dim_store_details' 
-databaseconnector_instance.upload_to_db(clean_store_data_df, 'dim_store_details')
+    # # fetching and cleaning products data 
+    clean_weights_df = datacleaning_instance.clean_products_table()
 
-# CLEAN PRODUCTS 
+    # # uploading products data to database, using 'upload_to_db method of DatabaseConnector class, and called the products data 'dim_products' 
+    if not databaseconnector_instance.upload_to_db(clean_weights_df, 'dim_products'):
+        raise SystemExit("Uploading 'dim_products' failed, see the log for the error")
 
-# # fetching and cleaning products data 
-clean_weights_df = datacleaning_instance.clean_products_table()
+    # DATE EVENTS  
 
-# # uploading products data to database, using 'upload_to_db method of DatabaseConnector class, and called the products data 'dim_products' 
-databaseconnector_instance.upload_to_db(clean_weights_df, 'dim_products')
+    # fetching and date events data 
+    clean_date_events_df = datacleaning_instance.clean_date_events()
 
-# ORDERS TABLE  
+    # uploading date events data to database, using 'upload_to_db method of DatabaseConnector class, and called the date events data 'dim_date_times' 
+    if not databaseconnector_instance.upload_to_db(clean_date_events_df, 'dim_date_times'):
+        raise SystemExit("Uploading 'dim_date_times' failed, see the log for the error")
 
-# fetching and cleaning orders data 
-clean_orders_df = datacleaning_instance.clean_orders_data()
+    # ORDERS TABLE  
 
-# uploading orders data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'orders_table' 
-databaseconnector_instance.upload_to_db(clean_orders_df, 'orders_table')
+    # the orders are loaded last: once data_casting.py has added the foreign keys, an upsert of 
+    # orders that refer to rows missing from the dim_ tables would fail
 
-# DATE EVENTS  
+    # fetching and cleaning orders data 
+    clean_orders_df = datacleaning_instance.clean_orders_data()
 
-# fetching and date events data 
-clean_date_events_df = datacleaning_instance.clean_date_events()
+    # orders paid with a rejected card would break the foreign key to dim_card_details when casting
+    rejected_orders = clean_orders_df['card_number'].astype(str).isin(datacleaning_instance.rejected_cards['card_number'].astype(str))
+    if rejected_orders.any():
+        logging.error(f"{int(rejected_orders.sum())} orders use card numbers rejected by the card validation "
+                      f"(see DataCleaning.rejected_cards), so data_casting.py can't add the card_number foreign key; "
+                      f"set STRICT_CARD_VALIDATION=false to keep those cards")
 
-# uploading date events data to database, using 'upload_to_db method of DatabaseConnector class, and called the date events data 'dim_date_times' 
-databaseconnector_instance.upload_to_db(clean_date_events_df, 'dim_date_times')
\ No newline at end of file
+    # uploading orders data to database, using 'upload_to_db method of DatabaseConnector class, and called the legacy users data 'orders_table' 
+    if not databaseconnector_instance.upload_to_db(clean_orders_df, 'orders_table'):
+        raise SystemExit("Uploading 'orders_table' failed, see the log for the error")
\ No newline at end of file
@@ -1,3 +1,12 @@
+import asyncio
+import codecs
+import contextlib
+import io
+import hashlib
+import json
+import mmap
+import tempfile
+import threading
 import time 
 import pandas as pd
 import tabula
@@ -5,8 +14,12 @@ import logging
 import os 
 import requests
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
-from sqlalchemy import MetaData, Table
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from sqlalchemy import String, and_, func, or_, select, text, true
 from io import BytesIO
 from urllib.parse import urlparse
 from database_utils import DatabaseConnector
@@ -14,6 +27,620 @@ from database_utils import DatabaseConnector
 # Setup logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+class TokenBucket:
+    """
+    An asyncio token-bucket rate limiter shared by concurrent API requests. The refill rate 
+    halves whenever the API answers 429 and creeps back up after successful requests, and 
+    a Retry-After from the API pauses every request until it has passed.
+
+    Attributes:
+        rate (float): The current number of requests allowed per second.
+        max_rate (float): The configured (and maximum) number of requests per second.
+        min_rate (float): The rate is never throttled below this number of requests per second.
+        capacity (float): The maximum number of tokens, i.e. the largest allowed burst.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.5):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # waiters queue on the lock, so tokens are handed out in request order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                # honour any Retry-After pause before handing out tokens
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self, retry_after=None):
+        # multiplicative decrease on a 429, plus a pause if the API said how long to wait
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def recover(self):
+        # additive increase back towards the configured rate after a success
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header, which is either a number of seconds or an HTTP date.
+
+    Args:
+        value (str): The header value, or None.
+
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FrameCache:
+    """
+    A local on-disk cache of parsed DataFrames, stored in a columnar format (Parquet) so that a 
+    cache hit skips both the download and the parsing. An index file records each entry's size, 
+    age and metadata, and entries are evicted by total size (least recently used first) and age.
+
+    Attributes:
+        directory (str): The directory the cached files and the index are kept in.
+        max_bytes (int): The maximum total size of the cached files, or None for no limit.
+        max_age (float): The maximum age of an entry in seconds, or None for no limit.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def get(self, key):
+        """
+        Returns the cached DataFrame for a key, or None if it isn't cached (or has expired).
+        """
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+
+            if self.max_age is not None and time.time() - entry['created'] > self.max_age:
+                self._remove(index, key)
+                self._save_index(index)
+                return None
+
+            path = os.path.join(self.directory, entry['file'])
+            try:
+                df = pd.read_parquet(path) if entry['format'] == 'parquet' else pd.read_pickle(path)
+            except Exception as e:
+                logging.error(f"Error reading cached file {path}: {e}")
+                self._remove(index, key)
+                self._save_index(index)
+                return None
+
+            entry['last_used'] = time.time()
+            self._save_index(index)
+            return df
+
+    def put(self, cache_key, df, **metadata):
+        """
+        Stores a DataFrame under a cache key, with any metadata (e.g. bucket, key and ETag) that 
+        find_latest can later search on, then evicts entries over the size and age limits.
+        """
+        with self._lock:
+            index = self._load_index()
+            file_name = hashlib.sha256(cache_key.encode()).hexdigest()
+
+            # Parquet can't store columns of mixed types, so fall back to a pickle for those
+            try:
+                path = os.path.join(self.directory, f"{file_name}.parquet")
+                df.to_parquet(f"{path}.tmp")
+                file_format = 'parquet'
+            except Exception as e:
+                logging.info(f"Could not cache as Parquet ({e}), caching as a pickle instead")
+                path = os.path.join(self.directory, f"{file_name}.pickle")
+                df.to_pickle(f"{path}.tmp", compression=None)
+                file_format = 'pickle'
+            os.replace(f"{path}.tmp", path)
+
+            now = time.time()
+            index[cache_key] = {
+                'file': os.path.basename(path),
+                'format': file_format,
+                'size': os.path.getsize(path),
+                'created': now,
+                'last_used': now,
+                'metadata': metadata
+            }
+            self._evict(index)
+            self._save_index(index)
+
+    def find_latest(self, **metadata):
+        """
+        Returns the key and age in seconds of the newest entry whose metadata matches, or 
+        (None, None). Used to fall back to a cached copy when the source can't be checked.
+        """
+        # the metadata is compared as it is stored in the index, e.g. with tuples as lists
+        metadata = json.loads(json.dumps(metadata))
+
+        with self._lock:
+            index = self._load_index()
+
+        matches = [(entry['created'], key) for key, entry in index.items()
+                   if all(entry['metadata'].get(name) == value for name, value in metadata.items())]
+        if not matches:
+            return None, None
+
+        created, key = max(matches)
+        return key, time.time() - created
+
+    def _remove(self, index, key):
+        entry = index.pop(key)
+        try:
+            os.remove(os.path.join(self.directory, entry['file']))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, index):
+        # drop entries that are too old
+        if self.max_age is not None:
+            now = time.time()
+            for key in [key for key, entry in index.items() if now - entry['created'] > self.max_age]:
+                self._remove(index, key)
+
+        # then drop the least recently used entries until the cache fits in max_bytes
+        if self.max_bytes is not None:
+            total = sum(entry['size'] for entry in index.values())
+            for key in sorted(index, key=lambda key: index[key]['last_used']):
+                if total <= self.max_bytes:
+                    break
+                total -= index[key]['size']
+                self._remove(index, key)
+
+
+class MappedFile(io.RawIOBase):
+    """
+    A read-only, seekable file object over a memory map, so that pandas can parse a buffer 
+    assembled by download_s3_ranges without copying it.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._buffer.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._buffer.seek(offset, whence)
+        return self._buffer.tell()
+
+    def tell(self):
+        return self._buffer.tell()
+
+    def close(self):
+        if not self.closed:
+            self._buffer.close()
+        super().close()
+
+
+def download_s3_ranges(s3, bucket, key, size, etag=None, part_size=8 * 1024 * 1024, max_workers=8, 
+                       max_attempts=5, memory_limit=512 * 1024 * 1024):
+    """
+    Downloads an S3 object as parallel ranged GETs on a thread pool sharing one boto3 client, 
+    writing each range straight into its place in a preallocated buffer. Objects larger than 
+    memory_limit are assembled in a memory-mapped temporary file instead of in memory. After 
+    a transient error only the failed ranges are fetched again.
+
+    Args:
+        s3 (boto3.client): The S3 client, shared by every thread.
+        bucket (str): The bucket of the object.
+        key (str): The key of the object.
+        size (int): The size of the object in bytes.
+        etag (str, optional): The ETag of the object. If given, every range must come from this 
+            version of the object.
+        part_size (int): The size of each range in bytes.
+        max_workers (int): The number of ranges downloaded at once.
+        max_attempts (int): The number of times a range is tried before giving up.
+        memory_limit (int): Objects larger than this are assembled in a temporary file.
+
+    Returns:
+        io.BufferedReader: A file object over the assembled buffer, positioned at the start.
+
+    Raises:
+        RuntimeError: If some ranges still fail after max_attempts.
+    """
+
+    # preallocate the whole object, anonymously in memory or backed by a temporary file
+    if size > memory_limit:
+        with tempfile.TemporaryFile() as temp_file:
+            temp_file.truncate(size)
+            buffer = mmap.mmap(temp_file.fileno(), size)
+    else:
+        buffer = mmap.mmap(-1, size)
+
+    def fetch_range(byte_range):
+        start, end = byte_range
+        request = {'Bucket': bucket, 'Key': key, 'Range': f'bytes={start}-{end}'}
+        if etag:
+            request['IfMatch'] = etag
+        data = s3.get_object(**request)['Body'].read()
+        if len(data) != end - start + 1:
+            raise IOError(f"Expected {end - start + 1} bytes for range {start}-{end}, got {len(data)}")
+        buffer[start:end + 1] = data
+
+    pending = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+    for attempt in range(1, max_attempts + 1):
+        failed = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch_range, byte_range): byte_range for byte_range in pending}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except (BotoCoreError, ClientError, IOError) as e:
+                    logging.error(f"Range {futures[future]} of s3://{bucket}/{key} failed on attempt {attempt}: {e}")
+                    failed.append(futures[future])
+
+        if not failed:
+            return io.BufferedReader(MappedFile(buffer))
+
+        # resume with only the ranges that failed, after a short backoff
+        pending = sorted(failed)
+        time.sleep(2 ** attempt * 0.1)
+
+    buffer.close()
+    raise RuntimeError(f"{len(pending)} ranges of s3://{bucket}/{key} failed after {max_attempts} attempts")
+
+
+class StoreResponseCache:
+    """
+    A persistent cache of store detail API responses, one JSON file per store, holding the 
+    response body with its ETag / Last-Modified validators. Cached stores are revalidated with 
+    If-None-Match / If-Modified-Since, so an unchanged store costs a 304 with no body. When 
+    the API sent no validators, the cached body is reused without a request until it is older 
+    than the TTL.
+
+    Attributes:
+        directory (str): The directory the cached responses are kept in.
+        ttl (float): How long, in seconds, a response without validators is reused for.
+    """
+
+    def __init__(self, directory, ttl=86400):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, store_number):
+        return os.path.join(self.directory, f"store_{store_number}.json")
+
+    def get(self, store_number):
+        """
+        Returns the cached entry for a store, or None if it isn't cached.
+        """
+        try:
+            with open(self._path(store_number)) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        """
+        Returns True if an entry can be used without asking the API, i.e. it has no validators 
+        to revalidate with and is younger than the TTL.
+        """
+        has_validators = entry.get('etag') or entry.get('last_modified')
+        return not has_validators and time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """
+        Returns the If-None-Match / If-Modified-Since headers for revalidating an entry.
+        """
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, store_number, body, response_headers):
+        """
+        Stores a response body with the validators from its response headers.
+        """
+        entry = {
+            'body': body,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'fetched_at': time.time()
+        }
+        self._write(store_number, entry)
+
+    def touch(self, store_number, entry):
+        """
+        Marks an entry as just revalidated, after the API answered 304 Not Modified.
+        """
+        entry['fetched_at'] = time.time()
+        self._write(store_number, entry)
+
+    def _write(self, store_number, entry):
+        temp_path = f"{self._path(store_number)}.tmp"
+        with open(temp_path, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(temp_path, self._path(store_number))
+
+
+# the compression codecs recognised from a file's final extension, as pandas compression names
+COMPRESSION_EXTENSIONS = {'gz': 'gzip', 'gzip': 'gzip', 'zst': 'zstd', 'zstd': 'zstd'}
+
+# the file formats recognised from a file's extension
+FILE_FORMATS = {
+    'csv': 'csv',
+    'json': 'json',
+    'jsonl': 'jsonl',
+    'ndjson': 'jsonl',
+    'parquet': 'parquet',
+    'pq': 'parquet',
+    'feather': 'feather',
+    'arrow': 'feather',
+    'ipc': 'feather'
+}
+
+
+def detect_file_format(key):
+    """
+    Detects the file format and compression codec of a file from its extensions, 
+    e.g. 'products.csv.gz' is ('csv', 'gzip') and 'products.parquet' is ('parquet', None).
+
+    Args:
+        key (str): The file name or S3 key.
+
+    Returns:
+        tuple: The file format and the compression codec (or None).
+
+    Raises:
+        ValueError: If the file format isn't supported.
+    """
+    extensions = key.lower().split('/')[-1].split('.')[1:]
+
+    compression = None
+    if extensions and extensions[-1] in COMPRESSION_EXTENSIONS:
+        compression = COMPRESSION_EXTENSIONS[extensions.pop()]
+
+    file_extension = extensions[-1] if extensions else ''
+    if file_extension not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file extension: {file_extension}")
+
+    return FILE_FORMATS[file_extension], compression
+
+
+def read_file(buffer, key, columns=None, filters=None):
+    """
+    Parses a file into a DataFrame, based on its format and compression codec (see detect_file_format). 
+    For Parquet only the requested columns are decoded and row groups are skipped using the 
+    filters; Feather / Arrow IPC files also only decode the requested columns.
+
+    Args:
+        buffer (file-like): The file contents.
+        key (str): The file name or S3 key, used to detect the format.
+        columns (list, optional): The columns to decode from columnar formats. Defaults to every column.
+        filters (list, optional): Parquet row filters in pyarrow form, e.g. [('year', '>=', '2000')].
+
+    Returns:
+        pd.DataFrame: The parsed data.
+    """
+    file_format, compression = detect_file_format(key)
+
+    if file_format == 'csv':
+        return pd.read_csv(buffer, compression=compression)
+    elif file_format == 'json':
+        return pd.read_json(buffer, compression=compression)
+    elif file_format == 'jsonl':
+        return pd.read_json(buffer, lines=True, compression=compression)
+    elif file_format == 'parquet':
+        return pd.read_parquet(buffer, columns=columns, filters=filters)
+    else:
+        return pd.read_feather(buffer, columns=columns)
+
+
+# Process-wide S3 client, created on first use and shared by every extract and thread
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Returns the shared boto3 S3 client, creating it the first time it's needed. boto3 clients 
+    are thread-safe, so one client (and its connection pool) is reused by every S3 extract in 
+    a run, including parallel downloads.
+
+    The client is configured from environment variables: S3_MAX_POOL_CONNECTIONS, 
+    S3_RETRY_MODE, S3_MAX_ATTEMPTS, S3_CONNECT_TIMEOUT, S3_READ_TIMEOUT and S3_ENDPOINT_URL.
+
+    Args:
+        None
+
+    Returns:
+        boto3.client: The shared S3 client.
+    """
+    global _s3_client
+
+    with _s3_client_lock:
+        if _s3_client is None:
+            config = Config(
+                max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32)),
+                retries={
+                    'mode': os.getenv('S3_RETRY_MODE', 'standard'),
+                    'max_attempts': int(os.getenv('S3_MAX_ATTEMPTS', 5))
+                },
+                connect_timeout=float(os.getenv('S3_CONNECT_TIMEOUT', 10)),
+                read_timeout=float(os.getenv('S3_READ_TIMEOUT', 60))
+            )
+
+            # a dedicated session, so the client doesn't depend on boto3's global default session
+            session = boto3.session.Session()
+            _s3_client = session.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL'), config=config)
+            logging.info('S3 client created')
+
+    return _s3_client
+
+
+def read_pdf_pages(pdf_path, pages, tabula_options=None):
+    """
+    Extracts the tables on some pages of a PDF with tabula. Defined at module level so it can 
+    run in a worker process.
+
+    Args:
+        pdf_path (str): The local path of the PDF.
+        pages (list): The page numbers (starting at 1) to extract.
+        tabula_options (dict, optional): Extra keyword arguments for tabula.read_pdf.
+
+    Returns:
+        list: The DataFrames of the tables on those pages, in page order.
+    """
+    return tabula.read_pdf(pdf_path, pages=pages, **(tabula_options or {}))
+
+
+def parse_s3_uri(uri):
+    """
+    Splits an S3 URI into its bucket and key. Both 'https://<bucket>.s3...amazonaws.com/<key>' 
+    and 's3://<bucket>/<key>' URIs are supported.
+
+    Args:
+        uri (str): The S3 URI of the file.
+
+    Returns:
+        tuple: The bucket and key.
+
+    Raises:
+        ValueError: If the URI scheme isn't https or s3.
+    """
+    # setting parsed_url to be the parsed uri passed in as an argument  
+    parsed_url = urlparse(uri)
+    
+    # splitting out the bucket and key from the URI, with an else statement to handle invalid URIs 
+    if parsed_url.scheme == 'https':
+        bucket = parsed_url.netloc.split('.')[0]
+        key = parsed_url.path.lstrip('/')
+    elif parsed_url.scheme == 's3':
+        bucket = parsed_url.netloc
+        key = parsed_url.path.lstrip('/')
+    else:
+        raise ValueError(f"Invalid URI scheme: {parsed_url.scheme}")
+
+    return bucket, key
+
+
+def build_select(table, columns=None, exclude_columns=None, filters=None, distinct=False):
+    """
+    Builds a SELECT for a reflected table with column selection and simple row filters, so 
+    that they are applied by the database rather than after the data has been transferred.
+
+    Filters are tuples of (column, operator) or (column, operator, value), where the column 
+    can be '*' to apply the filter to every selected column. The operators are:
+        'not_null': the column is not NULL. If a value is given, it is treated as a NULL 
+            marker in text columns too, e.g. ('*', 'not_null', 'NULL').
+        'eq' / 'ne': the column equals / doesn't equal the value.
+        'in' / 'not_in': the column is / isn't in the list of values.
+        'regex': the column matches the regular expression in the value.
+
+    Args:
+        table (sqlalchemy.Table): The reflected table.
+        columns (list, optional): The columns to select. Defaults to every column.
+        exclude_columns (list, optional): Columns to leave out of the selection.
+        filters (list, optional): Row filters, as described above.
+        distinct (bool): Whether to remove duplicate rows. Defaults to False.
+
+    Returns:
+        tuple: The SELECT statement and the list of selected column names.
+
+    Raises:
+        ValueError: If a filter uses an unknown operator.
+    """
+    selected = [table.c[name] for name in columns] if columns else list(table.columns)
+    if exclude_columns:
+        selected = [column for column in selected if column.name not in exclude_columns]
+
+    conditions = []
+    for column_name, operator, *value in filters or []:
+        value = value[0] if value else None
+        targets = selected if column_name == '*' else [table.c[column_name]]
+
+        for column in targets:
+            if operator == 'not_null':
+                conditions.append(column.isnot(None))
+                # only compare text columns against a NULL marker like 'NULL'
+                if value is not None and isinstance(column.type, String):
+                    conditions.append(column != value)
+            elif operator == 'eq':
+                conditions.append(column == value)
+            elif operator == 'ne':
+                conditions.append(column != value)
+            elif operator == 'in':
+                conditions.append(column.in_(value))
+            elif operator == 'not_in':
+                conditions.append(column.notin_(value))
+            elif operator == 'regex':
+                conditions.append(column.regexp_match(value))
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+
+    select_query = select(*selected).where(and_(true(), *conditions))
+    if distinct:
+        select_query = select_query.distinct()
+
+    return select_query, [column.name for column in selected]
+
 class DataExtractor:
     """
     A class that provides methods to extract data from various sources including 
@@ -25,6 +652,24 @@ class DataExtractor:
         pdf_path (str): The file path to the PDF document for data extraction.
         s3_dates_url (str): The S3 URL for date-related data.
         s3_products_url (str): The S3 URL for product-related data.
+        stores_fetch_mode (str): 'sync' to fetch store details one by one, or 'async' to fetch them concurrently.
+        stores_concurrency (int): The maximum number of store requests in flight in 'async' mode.
+        stores_rate_limit (float): The maximum number of store requests per second in 'async' mode.
+        stores_checkpoint_path (str): The JSON lines file retrieved stores are checkpointed to, or None (the default) to disable checkpointing.
+        stores_checkpoint_max_age (float): How long, in seconds, a checkpoint is resumed from; older checkpoints are discarded.
+        store_cache (StoreResponseCache): The persistent cache of store API responses, or None if STORE_CACHE_DIR isn't set.
+        stream_chunk_size (int): The number of rows per chunk when streaming tables from RDS.
+        read_partitions (int): The default number of ranges for partitioned table reads.
+        read_workers (int): The default number of ranges read at once in partitioned table reads.
+        s3_chunk_size (int): The number of rows per chunk when streaming files from S3.
+        s3_cache (FrameCache): The local cache of parsed S3 files, or None if S3_CACHE_DIR isn't set.
+        s3_cache_ttl (float): How long, in seconds, a cached S3 file is used for when S3 can't be reached.
+        s3_multipart_threshold (int): S3 files at least this many bytes are downloaded as parallel byte ranges, or None to always download them as one stream.
+        s3_part_size (int): The size in bytes of each range in a parallel S3 download.
+        s3_download_workers (int): The number of ranges downloaded at once.
+        pdf_workers (int): The number of processes used to extract tables from PDFs (1 extracts in this process).
+        pdf_pages_per_batch (int): The number of PDF pages per batch, or None to size the batches automatically.
+        pdf_cache (FrameCache): The local cache of tables extracted from PDFs, or None if PDF_CACHE_DIR isn't set.
     
     """
     
@@ -38,7 +683,54 @@ class DataExtractor:
             load_dotenv()
             self.no_stores_endpoint = os.getenv('NO_STORES_ENDPOINT')
             self.store_info_endpoint = os.getenv('STORE_INFO_ENDPOINT')
-            self.no_stores = 451 # this is the result from list_number_of_stores
+            self.no_stores = None # read from list_number_of_stores when it's first needed
+
+            # settings for fetching the store details
+            self.stores_fetch_mode = os.getenv('STORES_FETCH_MODE', 'sync')
+            self.stores_concurrency = int(os.getenv('STORES_CONCURRENCY', 20))
+            self.stores_rate_limit = float(os.getenv('STORES_RATE_LIMIT', 20))
+            self.stores_checkpoint_path = os.getenv('STORES_CHECKPOINT_PATH') or None
+            self.stores_checkpoint_max_age = float(os.getenv('STORES_CHECKPOINT_MAX_AGE', 86400))
+
+            # settings for the persistent cache of store API responses
+            store_cache_dir = os.getenv('STORE_CACHE_DIR')
+            self.store_cache = StoreResponseCache(store_cache_dir, float(os.getenv('STORE_CACHE_TTL', 86400))) if store_cache_dir else None
+
+            # settings for streaming tables from RDS
+            self.stream_chunk_size = int(os.getenv('STREAM_CHUNK_SIZE', 50000))
+
+            # settings for partitioned (parallel) table reads from RDS
+            self.read_partitions = int(os.getenv('READ_PARTITIONS', 8))
+            self.read_workers = int(os.getenv('READ_WORKERS', 4))
+
+            # settings for streaming files from S3
+            self.s3_chunk_size = int(os.getenv('S3_CHUNK_SIZE', 50000))
+
+            # settings for the local cache of parsed S3 files
+            s3_cache_dir = os.getenv('S3_CACHE_DIR')
+            s3_cache_max_bytes = os.getenv('S3_CACHE_MAX_BYTES')
+            s3_cache_max_age = os.getenv('S3_CACHE_MAX_AGE')
+            self.s3_cache = FrameCache(s3_cache_dir, 
+                                       int(s3_cache_max_bytes) if s3_cache_max_bytes else None, 
+                                       float(s3_cache_max_age) if s3_cache_max_age else None) if s3_cache_dir else None
+            self.s3_cache_ttl = float(os.getenv('S3_CACHE_TTL', 86400))
+
+            # settings for parallel ranged downloads of large S3 files
+            # (off unless S3_MULTIPART_THRESHOLD is set, as it needs an extra HEAD request per file)
+            self.s3_multipart_threshold = int(os.getenv('S3_MULTIPART_THRESHOLD') or 0) or None
+            self.s3_part_size = int(os.getenv('S3_PART_SIZE', 8 * 1024 * 1024))
+            self.s3_download_workers = int(os.getenv('S3_DOWNLOAD_WORKERS', 8))
+
+            # settings for parallel PDF extraction
+            self.pdf_workers = int(os.getenv('PDF_WORKERS', 1))
+            pdf_pages_per_batch = os.getenv('PDF_PAGES_PER_BATCH')
+            self.pdf_pages_per_batch = int(pdf_pages_per_batch) if pdf_pages_per_batch else None
+
+            # settings for the local cache of tables extracted from PDFs
+            pdf_cache_dir = os.getenv('PDF_CACHE_DIR')
+            pdf_cache_max_bytes = os.getenv('PDF_CACHE_MAX_BYTES')
+            self.pdf_cache = FrameCache(pdf_cache_dir, 
+                                        int(pdf_cache_max_bytes) if pdf_cache_max_bytes else None) if pdf_cache_dir else None
         
         except ValueError as ve:
             logging.error(f"Error loading environment variables: {ve}")
@@ -47,12 +739,28 @@ class DataExtractor:
             logging.error(f"An unexpected error occurred: {e}")
             raise     
 
-    def read_data_from_table(self, table_name):         
+    def read_data_from_table(self, table_name, partition_column=None, partitions=None, max_workers=None, 
+                             columns=None, exclude_columns=None, filters=None, distinct=False):         
         """
         Extracts data from a specified table in an AWS RDS database.
 
+        Column selection and row filters are compiled into the SELECT (see build_select), so 
+        that only the data that is needed is sent from RDS.
+
+        If a partition column is given, the table is split into ranges of that column (or of 
+        physical pages, if the column is 'ctid') that are read in parallel on pooled connections 
+        and concatenated in range order.
+
         Args:
             table_name (str): The name of the table to extract data from.
+            partition_column (str, optional): A numeric column, or 'ctid', to split the table on. 
+                Defaults to None, which reads the table with a single query.
+            partitions (int, optional): The number of ranges to split the table into. Defaults to READ_PARTITIONS.
+            max_workers (int, optional): The number of ranges read at once. Defaults to READ_WORKERS.
+            columns (list, optional): The columns to select. Defaults to every column.
+            exclude_columns (list, optional): Columns to leave out of the selection.
+            filters (list, optional): Row filters, e.g. [('*', 'not_null', 'NULL')].
+            distinct (bool): Whether to remove duplicate rows. Defaults to False.
 
         Returns:
             pd.DataFrame: A DataFrame containing the data from the specified table.
@@ -60,21 +768,32 @@ class DataExtractor:
         
         logging.info('read_data_from_table is working')
 
+        # read the table in parallel ranges if a partition column is given
+        if partition_column:
+            try:
+                partition_dfs = list(self.iter_table_partitions(table_name, partition_column, partitions, max_workers, 
+                                                                columns, exclude_columns, filters, distinct))
+            except Exception as e:
+                logging.error(f"Error reading partitions of {table_name}: {e}")
+                return None
+            df = pd.concat(partition_dfs, ignore_index=True)
+
+            # identical rows share a column value, so only ranges of pages can split duplicates between them
+            if distinct and partition_column == 'ctid':
+                df = df.drop_duplicates(ignore_index=True)
+            return df
+
         # make an instance of the DatabaseConnector() object 
         db_connector = DatabaseConnector()  
         
         # make a database engine by using the method init_db_engine() of the instance of the DatabaseConnector object
         engine = db_connector.init_db_engine(prefix="RDS") 
         
-        # Create MetaData object, needed to store and manage information about the database's structure  
-        metadata = MetaData()
-
-        # try to create a table object 
+        # try to get a table object, reflected once per run (and cached on disk if REFLECTION_CACHE_DIR is set)
             # table_name = what table to look at  
-            # metadata = helps the table object find the table
-            # autoload_with = telling SQLAlchemy to use this specific connection to access the database and load the table’s details.
+            # prefix = which database the table is in 
         try: 
-            table = Table(table_name, metadata, autoload_with=engine)
+            table = db_connector.reflect_table(table_name, prefix="RDS")
         except Exception as e: 
             logging.error(f"Error reflecting table {table_name}: {e}")
             return None
@@ -82,16 +801,172 @@ class DataExtractor:
         # try to get data from table object 
         try: 
             with engine.connect() as connection: # creates a connection 
-                select_query = table.select() # requests some data from the table 
+                select_query, column_names = build_select(table, columns, exclude_columns, filters, distinct) # requests the needed data from the table 
                 result_of_query = connection.execute(select_query) # executing select_query and storing in result_of_query 
                 data = result_of_query.fetchall() # takes results from connection.execute(select_query) and stores them in data
-                df = pd.DataFrame(data, columns=[column.name for column in table.columns]) # convert the result to a DataFrame
+                df = pd.DataFrame(data, columns=column_names) # convert the result to a DataFrame
         except Exception as e: 
             logging.error(f"Error making database connection / retrieving data {table_name}: {e}") 
             return None 
 
         return df
 
+    def iter_table_partitions(self, table_name, partition_column, partitions=None, max_workers=None, 
+                              columns=None, exclude_columns=None, filters=None, distinct=False):
+        """
+        Reads a table from the AWS RDS database as ranges of a partition column, in parallel on a 
+        thread pool, and yields one DataFrame per range in range order, so the next stage can 
+        start on the first range while later ones are still being read.
+
+        Args:
+            table_name (str): The name of the table to extract data from.
+            partition_column (str): A numeric column, or 'ctid' to split on physical pages.
+            partitions (int, optional): The number of ranges to split the table into. Defaults to READ_PARTITIONS.
+            max_workers (int, optional): The number of ranges read at once. Defaults to READ_WORKERS.
+            columns (list, optional): The columns to select. Defaults to every column.
+            exclude_columns (list, optional): Columns to leave out of the selection.
+            filters (list, optional): Row filters, e.g. [('*', 'not_null', 'NULL')].
+            distinct (bool): Whether to remove duplicate rows within each range. Duplicates in 
+                different 'ctid' ranges are not removed. Defaults to False.
+
+        Yields:
+            pd.DataFrame: The rows of each range, in range order.
+        """
+
+        logging.info('iter_table_partitions is working')
+
+        partitions = partitions or self.read_partitions
+        max_workers = max_workers or self.read_workers
+
+        db_connector = DatabaseConnector()
+        engine = db_connector.init_db_engine(prefix="RDS")
+
+        table = db_connector.reflect_table(table_name, prefix="RDS")
+        select_query, column_names = build_select(table, columns, exclude_columns, filters, distinct)
+
+        with engine.connect() as connection:
+            conditions = self._partition_conditions(connection, table, partition_column, partitions)
+
+        def read_partition(condition):
+            # each worker checks out its own connection from the shared pool
+            with engine.connect() as connection:
+                data = connection.execute(select_query.where(condition)).fetchall()
+            return pd.DataFrame(data, columns=column_names)
+
+        # map yields results in the order of the conditions, whichever range finishes first
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for df in executor.map(read_partition, conditions):
+                yield df
+
+    def _partition_conditions(self, connection, table, partition_column, partitions):
+        # split on physical pages: each range is a TID range scan over a block of pages
+        if partition_column == 'ctid':
+            page_count_sql = "SELECT pg_relation_size(to_regclass(:table_name)) / current_setting('block_size')::int"
+            page_count = connection.execute(text(page_count_sql), {'table_name': f'"{table.name}"'}).scalar() or 0
+            bounds = [page_count * i // partitions for i in range(1, partitions)]
+            bounds = sorted(set(bound for bound in bounds if bound > 0))
+
+            conditions = []
+            lower = None
+            for upper in bounds:
+                condition = text(f"ctid < '({upper},0)'::tid") if lower is None else text(f"ctid >= '({lower},0)'::tid AND ctid < '({upper},0)'::tid")
+                conditions.append(condition)
+                lower = upper
+            # the last range is open-ended, to include any pages added since the size was read
+            conditions.append(text(f"ctid >= '({lower},0)'::tid") if lower is not None else true())
+            return conditions
+
+        # split on the values of a numeric column between its minimum and maximum
+        column = table.c[partition_column]
+        minimum, maximum = connection.execute(select(func.min(column), func.max(column))).one()
+        if minimum is None:
+            return [true()]
+
+        step = (maximum - minimum) / partitions
+        bounds = [minimum + step * i for i in range(1, partitions)]
+        if isinstance(minimum, int):
+            bounds = [int(bound) for bound in bounds]
+        bounds = sorted(set(bound for bound in bounds if minimum < bound <= maximum))
+
+        conditions = []
+        lower = None
+        for upper in bounds:
+            # NULLs go into the first range so that no rows are lost
+            condition = or_(column < upper, column.is_(None)) if lower is None else and_(column >= lower, column < upper)
+            conditions.append(condition)
+            lower = upper
+        conditions.append(column >= lower if lower is not None else true())
+        return conditions
+
+    def stream_data_from_table(self, table_name, chunk_size=None, columns=None, exclude_columns=None, filters=None, distinct=False):
+        """
+        Streams data from a specified table in an AWS RDS database as DataFrame chunks, using a 
+        server-side cursor so that only one chunk of rows is held in memory at a time.
+
+        Args:
+            table_name (str): The name of the table to extract data from.
+            chunk_size (int, optional): The number of rows per chunk. Defaults to STREAM_CHUNK_SIZE.
+            columns (list, optional): The columns to select. Defaults to every column.
+            exclude_columns (list, optional): Columns to leave out of the selection.
+            filters (list, optional): Row filters, e.g. [('*', 'not_null', 'NULL')].
+            distinct (bool): Whether to remove duplicate rows, with SELECT DISTINCT. Defaults to False.
+
+        Yields:
+            pd.DataFrame: DataFrames of up to chunk_size rows from the specified table.
+        """
+
+        logging.info('stream_data_from_table is working')
+
+        chunk_size = chunk_size or self.stream_chunk_size
+
+        db_connector = DatabaseConnector()
+        engine = db_connector.init_db_engine(prefix="RDS")
+
+        try:
+            table = db_connector.reflect_table(table_name, prefix="RDS")
+        except Exception as e:
+            logging.error(f"Error reflecting table {table_name}: {e}")
+            raise
+
+        select_query, column_names = build_select(table, columns, exclude_columns, filters, distinct)
+
+        try:
+            with engine.connect() as connection:
+                # stream_results makes psycopg2 use a named (server-side) cursor, fetched chunk_size rows at a time
+                streaming_connection = connection.execution_options(stream_results=True, max_row_buffer=chunk_size)
+                result = streaming_connection.execute(select_query)
+
+                for partition in result.partitions(chunk_size):
+                    yield pd.DataFrame(partition, columns=column_names)
+        except Exception as e:
+            logging.error(f"Error streaming data from {table_name}: {e}")
+            raise
+
+    def transfer_table(self, table_name, target_table, chunk_size=None, transform=None):
+        """
+        Streams a table from the AWS RDS database straight into the local database chunk by chunk, 
+        so peak memory stays at about one chunk regardless of the size of the table.
+
+        Args:
+            table_name (str): The name of the RDS table to extract data from.
+            target_table (str): The name of the table to load into.
+            chunk_size (int, optional): The number of rows per chunk. Defaults to STREAM_CHUNK_SIZE.
+            transform (callable, optional): A function applied to each chunk before it is uploaded, 
+                e.g. to drop columns.
+
+        Returns:
+            int: The number of rows transferred.
+        """
+
+        logging.info('transfer_table is working')
+
+        chunks = self.stream_data_from_table(table_name, chunk_size)
+        if transform:
+            chunks = (transform(chunk) for chunk in chunks)
+
+        db_connector = DatabaseConnector()
+        return db_connector.upload_chunks_to_db(chunks, target_table)
+
     def read_rds_table(self): 
         
         """
@@ -116,26 +991,121 @@ class DataExtractor:
 
         return dataframe
 
-    def retrieve_pdf_data(self, pdf_path):             
+    def retrieve_pdf_data(self, pdf_path, tabula_options=None):             
         """
         Extracts table data from a PDF document.
 
+        If PDF_WORKERS is more than 1, the pages are split into batches that are extracted in 
+        a pool of worker processes (each with its own JVM), and the tables are combined in page order.
+
+        If PDF_CACHE_DIR is set, the extracted table is cached by the SHA-256 of the PDF's bytes 
+        and the extraction options, so an unchanged PDF is loaded from the cache without 
+        starting tabula. A changed file or changed options are a different cache entry.
+
         Args:
-            None
+            pdf_path (str): The path or URL of the PDF document.
+            tabula_options (dict, optional): Extra keyword arguments for tabula.read_pdf.
 
         Returns:
             pd.DataFrame: A DataFrame containing the combined data from all tables in the PDF. 
         """
         
         logging.info('retrieve_pdf_data is working')
+
+        if not self.pdf_cache:
+            return self._extract_pdf_tables(pdf_path, tabula_options)
+
+        with self._local_pdf(pdf_path) as local_path:
+            # key the cache on the file's contents and everything that affects the extraction
+            sha256 = hashlib.sha256()
+            with open(local_path, 'rb') as pdf_file:
+                for block in iter(lambda: pdf_file.read(1024 * 1024), b''):
+                    sha256.update(block)
+            options = {'pages': 'all', 'tabula_version': getattr(tabula, '__version__', None), **(tabula_options or {})}
+            cache_key = f"pdf:{sha256.hexdigest()}:{json.dumps(options, sort_keys=True, default=str)}"
+
+            combined_df = self.pdf_cache.get(cache_key)
+            if combined_df is not None:
+                logging.info(f"Loaded tables from {pdf_path} from cache")
+                return combined_df
+
+            combined_df = self._extract_pdf_tables(local_path, tabula_options)
+            self.pdf_cache.put(cache_key, combined_df, pdf_sha256=sha256.hexdigest())
+
+        return combined_df
+
+    def _extract_pdf_tables(self, pdf_path, tabula_options=None):
+        if self.pdf_workers > 1:
+            return self.retrieve_pdf_data_parallel(pdf_path, tabula_options=tabula_options)
         
         # read_pdf returns a list of DataFrames in the PDF 
-        df = tabula.read_pdf(pdf_path, pages='all')  
+        df = tabula.read_pdf(pdf_path, pages='all', **(tabula_options or {}))  
 
         # concatinates the tables together into a df      
         combined_df = pd.concat(df, ignore_index=True)                
 
-        return combined_df 
+        return combined_df
+
+    @contextlib.contextmanager
+    def _local_pdf(self, pdf_path):
+        # PDFs at a URL are downloaded to a temporary file, which is removed afterwards
+        if urlparse(pdf_path).scheme not in ('http', 'https'):
+            yield pdf_path
+            return
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_path = os.path.join(temp_dir, 'document.pdf')
+            with requests.get(pdf_path, stream=True) as response:
+                response.raise_for_status()
+                with open(local_path, 'wb') as pdf_file:
+                    for block in response.iter_content(chunk_size=1024 * 1024):
+                        pdf_file.write(block)
+            yield local_path
+
+    def retrieve_pdf_data_parallel(self, pdf_path, max_workers=None, pages_per_batch=None, tabula_options=None):
+        """
+        Extracts table data from a PDF document in parallel. The PDF is downloaded once (if it 
+        is a URL), its pages are split into batches, and the batches are extracted with tabula 
+        in a pool of worker processes. The tables are combined in page order.
+
+        Args:
+            pdf_path (str): The path or URL of the PDF document.
+            max_workers (int, optional): The number of worker processes. Defaults to PDF_WORKERS.
+            pages_per_batch (int, optional): The number of pages per batch. Defaults to 
+                PDF_PAGES_PER_BATCH, or to about four batches per worker.
+            tabula_options (dict, optional): Extra keyword arguments for tabula.read_pdf.
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the combined data from all tables in the PDF. 
+        """
+
+        logging.info('retrieve_pdf_data_parallel is working')
+
+        max_workers = max_workers or self.pdf_workers
+
+        # pypdf is only needed to count the pages for the batches, so it is imported here
+        from pypdf import PdfReader
+
+        # the workers each read the file, so download it once rather than once per batch
+        with self._local_pdf(pdf_path) as local_path:
+            page_count = len(PdfReader(local_path).pages)
+
+            # several batches per worker, so a slow batch doesn't leave the other workers idle
+            pages_per_batch = pages_per_batch or self.pdf_pages_per_batch or max(1, -(-page_count // (max_workers * 4)))
+            batches = [list(range(start, min(start + pages_per_batch, page_count + 1))) 
+                       for start in range(1, page_count + 1, pages_per_batch)]
+
+            logging.info(f"Extracting {page_count} pages in {len(batches)} batches on {max_workers} processes")
+
+            # map returns the batches in page order, whichever finishes first
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                batch_tables = list(executor.map(read_pdf_pages, [local_path] * len(batches), batches, 
+                                                 [tabula_options] * len(batches)))
+
+        # concatinates the tables together into a df      
+        combined_df = pd.concat([table for tables in batch_tables for table in tables], ignore_index=True)
+
+        return combined_df
             
   
     def list_number_of_stores(self):
@@ -167,42 +1137,89 @@ class DataExtractor:
             logging.error(f'An error occurred: {e}')
             return None
 
+    def get_number_of_stores(self):
+        """
+        Returns the number of stores, read once from the API endpoint via list_number_of_stores.
+
+        Args:
+            None
+
+        Returns:
+            int: The number of stores.
+
+        Raises:
+            ValueError: If the number of stores can't be retrieved from the API.
+        """
+
+        if self.no_stores is None:
+            response = self.list_number_of_stores()
+            if not response or 'number_stores' not in response:
+                raise ValueError(f"Could not retrieve the number of stores from the API: {response}")
+            self.no_stores = int(response['number_stores'])
+            logging.info(f"The API reports {self.no_stores} stores")
+
+        return self.no_stores
+
     def retrieve_stores_data(self):   
         """
         Iterates through store numbers to retrieve store information via the API and compiles it into a DataFrame.
 
+        If STORES_CHECKPOINT_PATH is set, each store is written to that checkpoint file as soon as it 
+        is retrieved, so if a run fails part way, the next run only requests the stores that are 
+        missing or failed. The checkpoint is removed once every store has been retrieved, and a 
+        checkpoint older than STORES_CHECKPOINT_MAX_AGE is discarded rather than resumed from.
+
         Args:
-            no_stores (int): The total number of stores to iterate through.
+            None
 
         Returns:
             pd.DataFrame: A DataFrame containing the data for all stores. 
         """
         
         logging.info('retrieve_stores_data is working')
+
+        # fetch the stores concurrently if STORES_FETCH_MODE is 'async'
+        if self.stores_fetch_mode == 'async':
+            return self.retrieve_stores_data_async()
     
         db_connector = DatabaseConnector() 
 
         # get the API key via the read_api_key method 
         headers = db_connector.headers
 
-        # creating an empty list for the store details to go into 
-        store_data_list = []
-        store_skipped_list = [] 
+        # only the stores that aren't in the checkpoint from an earlier run need to be requested 
+        store_numbers = self._stores_to_fetch()
 
         # iterating through the list of stores and creating the specific store endpoint using the number of the store  
-        for store_number in range (0, self.no_stores):  
+        for store_number in store_numbers:  
             store_suffix = str(store_number) 
             store_info_endpoint = f'{self.store_info_endpoint}{store_suffix}'   
 
+            # use the cached response without a request if it can't be revalidated and is recent enough
+            cached = self.store_cache.get(store_number) if self.store_cache else None
+            if cached and self.store_cache.is_fresh(cached):
+                self._record_store_result(store_number, cached['body'])
+                continue
+
+            # ask the API to only send the store if it has changed since it was cached 
+            request_headers = {**headers, **(self.store_cache.conditional_headers(cached) if cached else {})}
+
             retry_count = 0
             max_retries = 5
             backoff_factor = 2
 
             while retry_count < max_retries:
                 try: 
-                    with requests.get(store_info_endpoint, headers=headers) as response:
+                    with requests.get(store_info_endpoint, headers=request_headers) as response:
                         response.raise_for_status()  # Check for HTTP errors
-                        store_data_list.append(response.json())
+                        if response.status_code == 304:  # Not Modified, so reuse the cached store
+                            self.store_cache.touch(store_number, cached)
+                            self._record_store_result(store_number, cached['body'])
+                        else:
+                            data = response.json()
+                            if self.store_cache:
+                                self.store_cache.put(store_number, data, response.headers)
+                            self._record_store_result(store_number, data)
                         break  # Exit the retry loop if the request is successful
                 except requests.exceptions.RequestException as e:
                     if response.status_code == 429:  # Too Many Requests
@@ -212,23 +1229,190 @@ class DataExtractor:
                         time.sleep(wait_time)
                     else:
                         logging.error(f'An error occurred for store {store_number}: {e}')
-                        store_skipped_list.append({"store_number": store_number, "error": str(e)})
+                        self._record_store_result(store_number, None, str(e))
                         break  # Exit the loop for other types of errors
+            else:
+                self._record_store_result(store_number, None, 'Rate limit retries exhausted')
+
+        # making a dataframe out of the store data, in store order
+        return self._finish_store_fetch()
+
+    def retrieve_stores_data_async(self, concurrency=None, rate_limit=None):
+        """
+        Retrieves store information for every store concurrently over a pooled HTTP connection, 
+        and compiles it into a DataFrame in store order.
+
+        Requests are bounded by a concurrency limit and a shared token-bucket rate limiter, 
+        which slows down when the API returns 429 and honours its Retry-After header. Stores 
+        are checkpointed as in retrieve_stores_data.
+
+        Args:
+            concurrency (int, optional): The maximum number of requests in flight. Defaults to STORES_CONCURRENCY.
+            rate_limit (float, optional): The maximum number of requests per second. Defaults to STORES_RATE_LIMIT.
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the data for all stores. 
+        """
+
+        logging.info('retrieve_stores_data_async is working')
+
+        db_connector = DatabaseConnector()
+
+        concurrency = concurrency or self.stores_concurrency
+        rate_limit = rate_limit or self.stores_rate_limit
+
+        store_numbers = self._stores_to_fetch()
+
+        asyncio.run(self._fetch_all_stores(db_connector.headers, concurrency, rate_limit, store_numbers))
+
+        return self._finish_store_fetch()
+
+    def _stores_to_fetch(self):
+        # start from the stores completed by an earlier run, if it left a checkpoint
+        self._completed_stores = {}
+        self._store_errors = {}
+
+        if not self.stores_checkpoint_path or not os.path.exists(self.stores_checkpoint_path):
+            return list(range(0, self.get_number_of_stores()))
+
+        # an old checkpoint holds stale store details, so it is discarded and every store is requested again
+        checkpoint_age = time.time() - os.path.getmtime(self.stores_checkpoint_path)
+        if checkpoint_age > self.stores_checkpoint_max_age:
+            logging.warning(f"Discarding checkpoint {self.stores_checkpoint_path}: it is {checkpoint_age:.0f}s old, "
+                            f"older than STORES_CHECKPOINT_MAX_AGE ({self.stores_checkpoint_max_age:.0f}s)")
+            os.remove(self.stores_checkpoint_path)
+            return list(range(0, self.get_number_of_stores()))
+
+        # only the stores that still exist are resumed, in case the number of stores has gone down
+        store_range = range(0, self.get_number_of_stores())
+        with open(self.stores_checkpoint_path) as checkpoint:
+            for line in checkpoint:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                if record.get('error') is None and record.get('store_number') in store_range:
+                    self._completed_stores[record['store_number']] = record['data']
+        logging.warning(f"Resuming from checkpoint {self.stores_checkpoint_path} ({checkpoint_age:.0f}s old): "
+                        f"reusing {len(self._completed_stores)} stores retrieved by an earlier run")
+
+        return [store_number for store_number in store_range if store_number not in self._completed_stores]
+
+    def _record_store_result(self, store_number, data, error=None):
+        if error is None:
+            self._completed_stores[store_number] = data
+            self._store_errors.pop(store_number, None)
+        else:
+            self._store_errors[store_number] = error
+
+        # append to the checkpoint straight away, so the result survives a crash
+        if self.stores_checkpoint_path:
+            with open(self.stores_checkpoint_path, 'a') as checkpoint:
+                checkpoint.write(json.dumps({'store_number': store_number, 'data': data, 'error': error}) + '\n')
+
+    def _finish_store_fetch(self):
+        # making a dataframe out of the list of store data, in store order
+        store_data_list = [self._completed_stores[store_number] for store_number in sorted(self._completed_stores)]
+        store_skipped_list = [{"store_number": store_number, "error": self._store_errors.get(store_number, 'Not retrieved')} 
+                              for store_number in range(0, self.get_number_of_stores()) 
+                              if store_number not in self._completed_stores]
 
-        # making a dataframe out of the list of store data 
         df_store = pd.DataFrame(store_data_list)
-        df_skipped = pd.DataFrame(store_skipped_list)
-        
+        self.df_skipped = pd.DataFrame(store_skipped_list)
+
+        if store_skipped_list:
+            logging.error(f'{len(store_skipped_list)} stores could not be retrieved, rerun to request only these stores')
+        elif self.stores_checkpoint_path and os.path.exists(self.stores_checkpoint_path):
+            # every store has been retrieved, so the next run should start afresh
+            os.remove(self.stores_checkpoint_path)
+
         return df_store
 
+    async def _fetch_all_stores(self, headers, concurrency, rate_limit, store_numbers):
+        # aiohttp is only needed for the async fetch, so it is imported here
+        import aiohttp
+
+        # one pooled session for every request, with at most `concurrency` open connections
+        bucket = TokenBucket(rate_limit)
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(total=30)
+
+        async def fetch_and_record(session, store_number):
+            result = await self._fetch_store(session, bucket, semaphore, store_number)
+            self._record_store_result(*result)
+            return result
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            tasks = [fetch_and_record(session, store_number) for store_number in store_numbers]
+
+            # gather returns the results in the order of the tasks, i.e. store order
+            return await asyncio.gather(*tasks)
+
+    async def _fetch_store(self, session, bucket, semaphore, store_number, max_retries=5, backoff_factor=2):
+        import aiohttp
 
-    def extract_from_s3(self, uri):
+        store_info_endpoint = f'{self.store_info_endpoint}{store_number}'
+
+        # use the cached response without a request if it can't be revalidated and is recent enough
+        cached = self.store_cache.get(store_number) if self.store_cache else None
+        if cached and self.store_cache.is_fresh(cached):
+            return store_number, cached['body'], None
+
+        # ask the API to only send the store if it has changed since it was cached 
+        request_headers = self.store_cache.conditional_headers(cached) if cached else {}
+
+        for retry_count in range(1, max_retries + 1):
+            await bucket.acquire()
+
+            async with semaphore:
+                try:
+                    async with session.get(store_info_endpoint, headers=request_headers) as response:
+                        if response.status == 429:  # Too Many Requests
+                            # 'Retry-After: 0' means retry straight away, so only back off when the header is missing
+                            wait_time = parse_retry_after(response.headers.get('Retry-After'))
+                            if wait_time is None:
+                                wait_time = backoff_factor ** retry_count
+                            bucket.throttle(wait_time)
+                            logging.error(f'Rate limit exceeded for store {store_number}. Retrying in {wait_time:.1f} seconds...')
+                            continue
+
+                        response.raise_for_status()
+                        bucket.recover()
+
+                        if response.status == 304:  # Not Modified, so reuse the cached store
+                            self.store_cache.touch(store_number, cached)
+                            return store_number, cached['body'], None
+
+                        data = await response.json(content_type=None)
+                        if self.store_cache:
+                            self.store_cache.put(store_number, data, response.headers)
+                        return store_number, data, None
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.error(f'An error occurred for store {store_number}: {e}')
+                    return store_number, None, str(e) or type(e).__name__
+
+        return store_number, None, 'Rate limit retries exhausted'
+
+
+    def extract_from_s3(self, uri, columns=None, filters=None):
 
         """
-        Extracts data from an AWS S3 URI. The data can be either in CSV or JSON format.
+        Extracts data from an AWS S3 URI. The data can be in CSV, JSON, line-delimited JSON, 
+        Parquet or Feather / Arrow IPC format, and CSV / JSON can be gzip or zstd compressed 
+        (e.g. 'products.csv.gz'). For the columnar formats only the requested columns are 
+        decoded, and Parquet row groups are skipped using the filters.
+
+        If S3_CACHE_DIR is set, the parsed data is cached locally by bucket, key and ETag. The 
+        ETag is checked with a HEAD request, so an unchanged file is loaded from the cache 
+        without downloading or parsing it. If S3 can't be reached, the newest cached copy is 
+        used if it is younger than S3_CACHE_TTL.
 
         Args:
             uri (str): The S3 URI of the file to extract.
+            columns (list, optional): The columns to decode from columnar formats. Defaults to every column.
+            filters (list, optional): Parquet row filters in pyarrow form, e.g. [('year', '>=', '2000')].
 
         Returns:
             pd.DataFrame: A DataFrame containing the data from the S3 file. 
@@ -236,42 +1420,115 @@ class DataExtractor:
 
         logging.info('extract_from_s3 is working')
 
-        # setting parsed_url to be the parsed uri passed in as an argument  
-        parsed_url = urlparse(uri)
-        
-        # splitting out the bucket and key from the URI, with an else statement to handle invalid URIs 
-        if parsed_url.scheme == 'https':
-            bucket = parsed_url.netloc.split('.')[0]
-            key = parsed_url.path.lstrip('/')
-        elif parsed_url.scheme == 's3':
-            bucket = parsed_url.netloc
-            key = parsed_url.path.lstrip('/')
-        else:
-            raise ValueError(f"Invalid URI scheme: {parsed_url.scheme}")
+        # splitting out the bucket and key from the URI 
+        bucket, key = parse_s3_uri(uri)
 
-        # creating a boto3 client to 'talk' to S3  
-        s3 = boto3.client('s3')
-    
-        # check the file extension to determine the format that needs to be extracted into the dataframe 
-        file_extension = key.split('.')[-1].lower()
-    
-        # Using a context manager to handle the BytesIO buffer
-        with BytesIO() as buffer:
+        # getting the shared boto3 client to 'talk' to S3  
+        s3 = get_s3_client()
+
+        if not self.s3_cache:
+            return self._read_s3_object(s3, bucket, key, columns=columns, filters=filters)
+
+        # check the ETag of the file, so an unchanged file can be loaded from the cache 
+        try:
+            head = s3.head_object(Bucket=bucket, Key=key)
+            etag = head['ETag'].strip('"')
+        except (BotoCoreError, ClientError) as e:
+            # S3 can't be reached, so fall back to the newest cached copy if it's recent enough
+            # only a copy read with the same columns and filters will do
+            cache_key, age = self.s3_cache.find_latest(bucket=bucket, key=key, columns=columns, filters=filters)
+            if cache_key is not None and age <= self.s3_cache_ttl:
+                df = self.s3_cache.get(cache_key)
+                if df is not None:
+                    logging.info(f"Could not check s3://{bucket}/{key} ({e}), using cached copy from {age:.0f} seconds ago")
+                    return df
+            raise
+
+        cache_key = f"s3://{bucket}/{key}@{etag}"
+        if columns or filters:
+            cache_key = f"{cache_key}?columns={columns}&filters={filters}"
+        df = self.s3_cache.get(cache_key)
+        if df is not None:
+            logging.info(f"Loaded s3://{bucket}/{key} from cache")
+            return df
+
+        df = self._read_s3_object(s3, bucket, key, head, columns, filters)
+        self.s3_cache.put(cache_key, df, bucket=bucket, key=key, etag=etag, columns=columns, filters=filters)
+
+        return df
+
+    def _read_s3_object(self, s3, bucket, key, head=None, columns=None, filters=None):
+        # check the file extension is supported before downloading anything 
+        detect_file_format(key)
+
+        # large files are downloaded as parallel byte ranges, the rest as one stream. The size is only 
+        # looked up (with a HEAD request, unless the cache already made one) if ranged downloads are on
+        if self.s3_multipart_threshold:
+            head = head or s3.head_object(Bucket=bucket, Key=key)
+        if self.s3_multipart_threshold and head['ContentLength'] >= self.s3_multipart_threshold:
+            buffer = download_s3_ranges(s3, bucket, key, head['ContentLength'], head['ETag'], 
+                                        self.s3_part_size, self.s3_download_workers)
+        else:
+            buffer = BytesIO()
             # Download the file from S3 into the buffer
             s3.download_fileobj(bucket, key, buffer)
-        
+    
+        # Using a context manager to handle the buffer
+        with buffer:
             # Move to the beginning of the buffer to read its content
             buffer.seek(0)
             
-            # Check if file extension is csv or json, and then load the data into a pandas DataFrame accordingly
-            if file_extension == 'csv':
-                df = pd.read_csv(buffer)
-            elif file_extension == 'json':
-                df = pd.read_json(buffer)
-            else:
-                raise ValueError(f"Unsupported file extension: {file_extension}")
+            # load the data into a pandas DataFrame according to the file's format and compression 
+            df = read_file(buffer, key, columns, filters)
         
-        return df 
+        return df
 
+    def stream_from_s3(self, uri, chunksize=None, lines=None):
 
+        """
+        Streams data from an AWS S3 URI as DataFrame chunks, reading the object body incrementally 
+        instead of downloading it into memory first. CSV is parsed with chunksize and line-delimited 
+        JSON (.jsonl / .ndjson, or lines=True) one block of lines at a time. A plain JSON document 
+        can't be parsed incrementally, so it is parsed whole and then split into chunks.
 
+        Args:
+            uri (str): The S3 URI of the file to extract.
+            chunksize (int, optional): The number of rows per chunk. Defaults to S3_CHUNK_SIZE.
+            lines (bool, optional): Whether a JSON file is line-delimited. Defaults to deciding 
+                from the file extension.
+
+        Yields:
+            pd.DataFrame: DataFrames of up to chunksize rows from the S3 file. 
+        """
+
+        logging.info('stream_from_s3 is working')
+
+        chunksize = chunksize or self.s3_chunk_size
+
+        bucket, key = parse_s3_uri(uri)
+
+        file_format, compression = detect_file_format(key)
+        if file_format not in ('csv', 'json', 'jsonl'):
+            raise ValueError(f"Streaming is only supported for CSV and JSON files, not {file_format}")
+        if lines is None:
+            lines = file_format == 'jsonl'
+
+        s3 = get_s3_client()
+
+        # the body is read from the network as the parser asks for more text, and compressed 
+        # bodies are decompressed by pandas as they are read
+        body = s3.get_object(Bucket=bucket, Key=key)['Body']
+        stream = body if compression else codecs.getreader('utf-8')(body)
+
+        try:
+            if file_format == 'csv':
+                yield from pd.read_csv(stream, chunksize=chunksize, compression=compression)
+            elif lines:
+                yield from pd.read_json(stream, lines=True, chunksize=chunksize, compression=compression)
+            else:
+                logging.info(f"{key} is not line-delimited JSON, so it is parsed whole before being chunked")
+                df = pd.read_json(stream, compression=compression)
+                for start in range(0, len(df), chunksize):
+                    yield df.iloc[start:start + chunksize]
+        finally:
+            body.close()
@@ -1,12 +1,124 @@
+import atexit
+import hashlib
+import io
 import logging
 import os 
+import pickle
+import re
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import MetaData, Table, create_engine, text
 from sqlalchemy.inspection import inspect
 
 # Setup logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# The tables loaded by the pipeline, in the order they are dropped by reset_database
+PIPELINE_TABLES = [
+    'orders_table',
+    'dim_products',
+    'dim_users',
+    'dim_store_details',
+    'dim_date_times',
+    'dim_card_details'
+]
+
+# The key columns used to match rows when upserting into each pipeline table
+UPSERT_KEYS = {
+    'dim_users': ['user_uuid'],
+    'dim_products': ['product_code'],
+    'dim_store_details': ['store_code'],
+    'dim_card_details': ['card_number'],
+    'dim_date_times': ['date_uuid'],
+    'orders_table': ['date_uuid', 'user_uuid', 'card_number', 'store_code', 'product_code']
+}
+
+# Process-wide engine registry, keyed by prefix ('DB' / 'RDS'), so every DatabaseConnector instance shares one connection pool per database
+_engine_registry = {}
+_engine_lock = threading.Lock()
+
+
+def dispose_engines():
+    """
+    Disposes every engine in the process-wide registry, closing all pooled connections.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with _engine_lock:
+        for prefix, (db_url, engine) in _engine_registry.items():
+            engine.dispose()
+            logging.info(f"Engine for {prefix} database disposed")
+        _engine_registry.clear()
+
+
+# make sure pooled connections are closed cleanly when the pipeline exits
+atexit.register(dispose_engines)
+
+# Process-wide reflection cache, keyed by prefix, holding the shared MetaData, the table names 
+# and the schema fingerprint they were reflected under
+_reflection_registry = {}
+_reflection_lock = threading.Lock()
+
+
+class DataFrameCSVStream:
+    """
+    A read-only file-like object that serialises a DataFrame to CSV one chunk of rows at a time, 
+    so it can be streamed into COPY ... FROM STDIN without the full CSV text sitting in memory.
+
+    Missing values are written as NULL_MARKER (the COPY statement's NULL string), so that they 
+    load as NULL while empty strings stay empty strings, as they do with to_sql.
+
+    Attributes:
+        dataframe (pd.DataFrame): The DataFrame being streamed.
+        chunk_size (int): The number of rows serialised per chunk.
+        rows_written (int): The number of rows serialised so far.
+    """
+
+    NULL_MARKER = '\\N'
+
+    def __init__(self, dataframe, chunk_size=50000):
+        self.dataframe = dataframe
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._chunk = io.StringIO()
+
+    def _next_chunk(self):
+        # serialise the next slice of rows, returning False once every row is written
+        if self.rows_written >= len(self.dataframe):
+            return False
+        chunk = self.dataframe.iloc[self.rows_written:self.rows_written + self.chunk_size]
+        self.rows_written += len(chunk)
+        self._chunk = io.StringIO(chunk.to_csv(header=False, index=False, na_rep=self.NULL_MARKER))
+        return True
+
+    def read(self, size=-1):
+        # read from the current chunk, moving on to the next one until the read is filled
+        parts = []
+        while size != 0:
+            data = self._chunk.read(size)
+            if data:
+                parts.append(data)
+                if size > 0:
+                    size -= len(data)
+            elif not self._next_chunk():
+                break
+        return ''.join(parts)
+
+    def readline(self):
+        # psycopg2 only uses read(), but some drivers expect readline() on COPY sources
+        parts = []
+        while True:
+            line = self._chunk.readline()
+            parts.append(line)
+            if line.endswith('\n') or not self._next_chunk():
+                break
+        return ''.join(parts)
+
 class DatabaseConnector: 
     """
     A utility class for managing database connections, including loading credentials, 
@@ -22,6 +134,20 @@ class DatabaseConnector:
 
         headers (dict): A dictionary containing HTTP headers, with the API key included as an 
             'x-api-key' entry for use in API requests.
+
+        pool_settings (dict): Connection pool settings (pool_size, max_overflow, pool_pre_ping, 
+            pool_recycle) used when an engine is first created for a prefix.
+
+        upload_method (str): The default upload method for upload_to_db, either 'to_sql' or 'copy'.
+
+        copy_chunk_size (int): The number of rows serialised per chunk by the COPY loader.
+
+        load_mode (str): The default load mode for upload_to_db, either 'replace', 'upsert' or 
+            'shadow' (build the tables in the shadow schema, then swap them into place).
+
+        shadow_schema (str): The schema tables are built in when using the 'shadow' load mode.
+
+        previous_schema (str): The schema the previous generation of tables is kept in after a swap.
     """
     
     def __init__(self):
@@ -66,6 +192,21 @@ class DatabaseConnector:
             # Store headers
             self.headers = {'x-api-key': self.api_key}
 
+            # Connection pool settings, shared by the engines in the registry
+            self.pool_settings = {
+                'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+                'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+                'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+                'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+            }
+
+            # Bulk loading settings for upload_to_db
+            self.upload_method = os.getenv('UPLOAD_METHOD', 'to_sql')
+            self.copy_chunk_size = int(os.getenv('COPY_CHUNK_SIZE', 50000))
+            self.load_mode = os.getenv('LOAD_MODE', 'replace')
+            self.shadow_schema = os.getenv('SHADOW_SCHEMA', 'shadow')
+            self.previous_schema = os.getenv('PREVIOUS_SCHEMA', 'previous')
+
             # Check for missing DB credentials
             for db_type, creds in self.credentials.items():
                 if not all(creds.values()):
@@ -78,12 +219,15 @@ class DatabaseConnector:
             logging.error(f"An unexpected error occurred: {e}")
             raise
 
-    def init_db_engine(self, prefix="DB"):   
+    def init_db_engine(self, prefix="DB", **pool_settings):   
         """
-        Creates an SQLAlchemy engine for the specified database type.
+        Returns the shared SQLAlchemy engine for the specified database type, creating it 
+        (and its connection pool) the first time the prefix is requested in this process.
 
         Args:
             prefix (str): Either 'DB' for the local database or 'RDS' for the remote database.
+            **pool_settings: Optional overrides for pool_size, max_overflow, pool_pre_ping and 
+                pool_recycle. Only used when the engine is first created.
 
         Returns:
             engine: A SQLAlchemy engine connected to the specified database.
@@ -100,14 +244,156 @@ class DatabaseConnector:
         # Construct the database URL, including the driver and credentials 
         db_url = f"{creds['driver']}://{creds['user']}:{creds['password']}@{creds['host']}:{creds['port']}/{creds['database']}"
 
-        # Logging to verify the method is working 
-        logging.info(f"init_db_engine is working for {prefix} database")
+        with _engine_lock:
+            # Reuse the pooled engine if one already exists for these credentials
+            registered = _engine_registry.get(prefix)
+            if registered and registered[0] == db_url:
+                return registered[1]
 
-        # Create and return the SQLAlchemy engine
-        engine = create_engine(db_url)
+            # Credentials changed since the engine was created, so close the old pool
+            if registered:
+                registered[1].dispose()
+
+            # Logging to verify the method is working 
+            logging.info(f"init_db_engine is working for {prefix} database")
+
+            # Create the SQLAlchemy engine with the pool settings, and register it for reuse
+            settings = {**self.pool_settings, **pool_settings}
+            engine = create_engine(db_url, **settings)
+            _engine_registry[prefix] = (db_url, engine)
         
         return engine    
 
+    def reflect_table(self, table_name, prefix="RDS"):
+        """
+        Returns a reflected SQLAlchemy Table, using an in-process MetaData shared per database so 
+        each table is only reflected once per run. If REFLECTION_CACHE_DIR is set, the MetaData 
+        is also pickled to disk and reused on later runs while the remote schema is unchanged.
+
+        Args:
+            table_name (str): The name of the table to reflect.
+            prefix (str): Either 'DB' for the local database or 'RDS' for the remote database.
+
+        Returns:
+            sqlalchemy.Table: The reflected table.
+        """
+
+        engine = self.init_db_engine(prefix=prefix)
+
+        with _reflection_lock:
+            entry = self._get_reflection_entry(prefix, engine)
+            metadata = entry['metadata']
+
+            if table_name not in metadata.tables:
+                logging.info(f"Reflecting table {table_name} from {prefix} database")
+                Table(table_name, metadata, autoload_with=engine)
+                self._save_reflection_cache(prefix, entry)
+
+            return metadata.tables[table_name]
+
+    def get_table_names(self, prefix="RDS"):
+        """
+        Returns the table names of a database, from the reflection cache when possible.
+
+        Args:
+            prefix (str): Either 'DB' for the local database or 'RDS' for the remote database.
+
+        Returns:
+            list: A list of table names in the specified database.
+        """
+
+        engine = self.init_db_engine(prefix=prefix)
+
+        with _reflection_lock:
+            entry = self._get_reflection_entry(prefix, engine)
+
+            if entry['table_names'] is None:
+                entry['table_names'] = inspect(engine).get_table_names()
+                self._save_reflection_cache(prefix, entry)
+
+            return list(entry['table_names'])
+
+    def _get_reflection_entry(self, prefix, engine):
+        # reuse this process's entry, otherwise try the on-disk cache, otherwise start empty
+        entry = _reflection_registry.get(prefix)
+        if entry is None:
+            entry = self._load_reflection_cache(prefix, engine) or {'metadata': MetaData(), 'table_names': None, 'fingerprint': None}
+            _reflection_registry[prefix] = entry
+        return entry
+
+    def _schema_fingerprint(self, engine):
+        # one catalog query that changes whenever a table or column in the schema changes
+        fingerprint_sql = """
+        SELECT table_name, column_name, data_type, is_nullable, ordinal_position
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        ORDER BY table_name, ordinal_position;
+        """
+        with engine.connect() as connection:
+            rows = connection.execute(text(fingerprint_sql)).fetchall()
+        return hashlib.sha256(repr([tuple(row) for row in rows]).encode()).hexdigest()
+
+    def _reflection_cache_path(self, prefix):
+        cache_dir = os.getenv('REFLECTION_CACHE_DIR')
+        if not cache_dir:
+            return None
+        creds = self.credentials[prefix]
+        database_key = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{creds['host']}_{creds['port']}_{creds['database']}")
+        return os.path.join(cache_dir, f"{database_key}.pickle")
+
+    def _load_reflection_cache(self, prefix, engine):
+        cache_path = self._reflection_cache_path(prefix)
+        if not cache_path:
+            return None
+
+        fingerprint = self._schema_fingerprint(engine)
+
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                entry = pickle.load(cache_file)
+        except FileNotFoundError:
+            return {'metadata': MetaData(), 'table_names': None, 'fingerprint': fingerprint}
+        except Exception as e:
+            logging.error(f"Error loading reflection cache {cache_path}: {e}")
+            return {'metadata': MetaData(), 'table_names': None, 'fingerprint': fingerprint}
+
+        # the remote schema has changed since the cache was written, so reflect again
+        if entry.get('fingerprint') != fingerprint:
+            logging.info(f"Schema of {prefix} database has changed, ignoring reflection cache")
+            return {'metadata': MetaData(), 'table_names': None, 'fingerprint': fingerprint}
+
+        logging.info(f"Loaded reflection cache for {prefix} database")
+        return entry
+
+    def _save_reflection_cache(self, prefix, entry):
+        cache_path = self._reflection_cache_path(prefix)
+        if not cache_path or entry['fingerprint'] is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+            # write to a temporary file first, so a crash never leaves a half-written cache
+            temp_path = f"{cache_path}.tmp"
+            with open(temp_path, 'wb') as cache_file:
+                pickle.dump(entry, cache_file)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            logging.error(f"Error saving reflection cache {cache_path}: {e}")
+
+    def dispose_engines(self):
+        """
+        Disposes all shared engines and their connection pools. Engines are recreated on the 
+        next call to init_db_engine.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        dispose_engines()
+
     def list_db_tables(self): 
         
         """
@@ -122,45 +408,370 @@ class DatabaseConnector:
          
         logging.info('list_db_tables is working')
         
-        # creates a engine to connect to the database by using the 'init_db_engine()' method  
-        engine = self.init_db_engine(prefix="RDS")
-    
-        # creating an inspector object to access data in the database and pass in engine to manage it's connection to the database 
-        inspector = inspect(engine) 
-
-        # getting the tables name using the get_table_names method of the inspector object from SQLAlchemy 
-        table_names = inspector.get_table_names()
+        # getting the table names from the reflection cache, which uses SQLAlchemy's inspector the first time 
+        table_names = self.get_table_names(prefix="RDS")
         
         # returning the list of table names 
         return table_names
 
-    def upload_to_db(self, dataframe, table_name):
+    def upload_to_db(self, dataframe, table_name, method=None, chunk_size=None, mode=None, keys=None):
         """
-        Uploads a Pandas DataFrame to the specified database.
+        Uploads a Pandas DataFrame to the specified database, either replacing the table or 
+        upserting the rows into it.
 
         Args:
             dataframe (pd.DataFrame): The DataFrame to be uploaded.
             table_name (str): The name to assign to the table in the database.
+            method (str, optional): 'to_sql' for pandas' INSERT path, or 'copy' to bulk load 
+                with COPY ... FROM STDIN. Defaults to the UPLOAD_METHOD environment variable.
+            chunk_size (int, optional): The number of rows serialised per chunk when using 
+                'copy'. Defaults to the COPY_CHUNK_SIZE environment variable.
+            mode (str, optional): 'replace' to drop and recreate the table, 'upsert' to merge 
+                the rows into the existing table, or 'shadow' to replace the table in the shadow 
+                schema. Defaults to the LOAD_MODE environment variable.
+            keys (list, optional): The key columns used to match rows when upserting. Defaults 
+                to the entry for the table in UPSERT_KEYS.
 
         Returns:
-            None
+            bool: True if the table was uploaded, False if an error occurred (it is logged).
 
         Raises:
-            Exception: If an error occurs during upload.  
+            ValueError: If an invalid method or mode is provided, or no upsert keys are configured.
         """
 
         logging.info('upload_to_db is working')
 
+        method = method or self.upload_method
+        if method not in ('to_sql', 'copy'):
+            raise ValueError(f"Invalid upload method '{method}'. Must be 'to_sql' or 'copy'.")
+
+        mode = mode or self.load_mode
+        if mode not in ('replace', 'upsert', 'shadow'):
+            raise ValueError(f"Invalid load mode '{mode}'. Must be 'replace', 'upsert' or 'shadow'.")
+
+        # in shadow mode the table is rebuilt away from readers, in the shadow schema
+        schema = self.shadow_schema if mode == 'shadow' else None
+
+        keys = keys or UPSERT_KEYS.get(table_name)
+        if mode == 'upsert' and not keys:
+            raise ValueError(f"No upsert keys configured for table '{table_name}'.")
+
         # run the init_my_db_engine method to get an engine for local database  
         engine = self.init_db_engine(prefix="DB")
 
         try:
-            # Upload the dataframe to the database
-            dataframe.to_sql(name=table_name, con=engine, if_exists='replace', index=False)
-            logging.info(f"Table '{table_name}' uploaded successfully.")
+            start = time.perf_counter()
+
+            if mode == 'upsert' and inspect(engine).has_table(table_name):
+                self.upsert_to_db(engine, dataframe, table_name, keys, method, chunk_size)
+            else:
+                if mode == 'upsert':
+                    logging.info(f"Table '{table_name}' does not exist yet, creating it instead of upserting.")
+                self.load_table(engine, dataframe, table_name, method, chunk_size, schema)
+
+            elapsed = time.perf_counter() - start
+            rows_per_second = len(dataframe) / elapsed if elapsed else float('inf')
+            logging.info(f"Table '{table_name}' uploaded successfully ({len(dataframe)} rows, {rows_per_second:,.0f} rows/sec via {method}, {mode}).")
+            return True
 
         except Exception as e:
-            logging.error(f"An error occurred while uploading the table: {e}")
+            logging.error(f"An error occurred while uploading the table '{table_name}': {e}")
+            return False
+
+    def upload_chunks_to_db(self, chunks, table_name, method=None, chunk_size=None, mode=None, keys=None):
+        """
+        Uploads an iterable of DataFrame chunks (e.g. from DataExtractor.stream_data_from_table) 
+        to the specified database without collecting them into one DataFrame. The first chunk 
+        is uploaded with upload_to_db, and the rest are appended (or upserted in 'upsert' mode). 
+        The upload stops at the first chunk that fails.
+
+        Args:
+            chunks (iterable): DataFrames with the same columns.
+            table_name (str): The name to assign to the table in the database.
+            method (str, optional): 'to_sql' or 'copy'. Defaults to the UPLOAD_METHOD environment variable.
+            chunk_size (int, optional): The number of rows serialised per COPY chunk.
+            mode (str, optional): 'replace', 'upsert' or 'shadow'. Defaults to the LOAD_MODE environment variable.
+            keys (list, optional): The key columns used to match rows when upserting.
+
+        Returns:
+            int: The number of rows uploaded before any failure.
+        """
+
+        logging.info('upload_chunks_to_db is working')
+
+        method = method or self.upload_method
+        mode = mode or self.load_mode
+        schema = self.shadow_schema if mode == 'shadow' else None
+        engine = self.init_db_engine(prefix="DB")
+
+        rows_uploaded = 0
+        start = time.perf_counter()
+
+        for chunk_number, chunk in enumerate(chunks):
+            if chunk_number == 0 or mode == 'upsert':
+                uploaded = self.upload_to_db(chunk, table_name, method, chunk_size, mode, keys)
+            else:
+                try:
+                    self.append_table(engine, chunk, table_name, method, chunk_size, schema)
+                    uploaded = True
+                except Exception as e:
+                    logging.error(f"An error occurred while appending to the table '{table_name}': {e}")
+                    uploaded = False
+
+            # don't append the remaining chunks to a missing or partly loaded table
+            if not uploaded:
+                logging.error(f"Upload of '{table_name}' stopped at chunk {chunk_number} after {rows_uploaded} rows.")
+                return rows_uploaded
+
+            rows_uploaded += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        rows_per_second = rows_uploaded / elapsed if elapsed else float('inf')
+        logging.info(f"Table '{table_name}' uploaded in chunks ({rows_uploaded} rows, {rows_per_second:,.0f} rows/sec).")
+
+        return rows_uploaded
+
+    def append_table(self, engine, dataframe, table_name, method, chunk_size=None, schema=None):
+        """
+        Appends the contents of a DataFrame to an existing table, using the specified upload method.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): The SQLAlchemy engine connected to the database.
+            dataframe (pd.DataFrame): The DataFrame to be appended.
+            table_name (str): The name of the table to append to.
+            method (str): 'to_sql' or 'copy'.
+            chunk_size (int, optional): The number of rows serialised per chunk when using 'copy'.
+            schema (str, optional): The schema of the table. Defaults to the search path.
+
+        Returns:
+            None
+        """
+        if method == 'copy':
+            self.copy_to_db(engine, dataframe, table_name, chunk_size, schema, create=False)
+        else:
+            dataframe.to_sql(name=table_name, con=engine, schema=schema, if_exists='append', index=False)
+
+    def load_table(self, engine, dataframe, table_name, method, chunk_size=None, schema=None):
+        """
+        Replaces a table with the contents of a DataFrame, using the specified upload method.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): The SQLAlchemy engine connected to the database.
+            dataframe (pd.DataFrame): The DataFrame to be loaded.
+            table_name (str): The name of the table to load into.
+            method (str): 'to_sql' or 'copy'.
+            chunk_size (int, optional): The number of rows serialised per chunk when using 'copy'.
+            schema (str, optional): The schema of the table. Defaults to the search path.
+
+        Returns:
+            None
+        """
+        if method == 'copy':
+            self.copy_to_db(engine, dataframe, table_name, chunk_size, schema)
+        else:
+            # Upload the dataframe to the database
+            dataframe.to_sql(name=table_name, con=engine, schema=schema, if_exists='replace', index=False)
+
+    def upsert_to_db(self, engine, dataframe, table_name, keys, method='to_sql', chunk_size=None):
+        """
+        Upserts a DataFrame into an existing table. The rows are loaded into a staging table, then 
+        merged with INSERT ... ON CONFLICT (keys) DO UPDATE, casting each column to the type of 
+        the target column. Rows whose values haven't changed are not rewritten, and the target's 
+        indexes and constraints are kept.
+
+        If the target has already been cast by data_casting.py, the staging table is first run 
+        through the same casting functions, so its values are cleaned (e.g. '£' removed, invalid 
+        values set to NULL) and its derived columns (e.g. weight_category, is_removed) are filled.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): The SQLAlchemy engine connected to the database.
+            dataframe (pd.DataFrame): The DataFrame to be upserted.
+            table_name (str): The name of the existing table to upsert into.
+            keys (list): The key columns used to match rows.
+            method (str): 'to_sql' or 'copy', used to load the staging table.
+            chunk_size (int, optional): The number of rows serialised per chunk when using 'copy'.
+
+        Returns:
+            int: The number of rows inserted or updated.
+        """
+
+        staging_table = f"{table_name}_staging"
+
+        # load the new rows into the staging table
+        self.load_table(engine, dataframe, staging_table, method, chunk_size)
+
+        try:
+            with engine.begin() as connection:
+                # get the column types of the target table, so staging values can be cast to match
+                column_types = self.get_column_types(connection, table_name)
+                staging_types = self.get_column_types(connection, staging_table)
+
+                # a target with different column types (or extra columns) has been cast by data_casting.py, 
+                # so clean and cast the staging table the same way before merging it
+                if any(column_types[column] != staging_types.get(column) for column in column_types):
+                    # imported here, as data_casting imports DatabaseConnector
+                    from data_casting import TABLE_CASTS
+                    if table_name in TABLE_CASTS:
+                        logging.info(f"'{table_name}' has been cast, casting the staging table to match.")
+                        TABLE_CASTS[table_name](connection, staging_table)
+                        staging_types = self.get_column_types(connection, staging_table)
+
+                # only merge the columns that exist in both the staging and the target table
+                columns = [column for column in staging_types if column in column_types]
+                update_columns = [column for column in columns if column not in keys]
+
+                dropped_columns = [column for column in staging_types if column not in column_types]
+                if dropped_columns:
+                    logging.warning(f"Columns {dropped_columns} are not in '{table_name}', so they are not upserted.")
+
+                self.ensure_unique_index(connection, table_name, keys)
+                self.widen_varchar_columns(connection, table_name, staging_table, column_types, columns)
+
+                key_list = ', '.join(f'"{key}"' for key in keys)
+                column_list = ', '.join(f'"{column}"' for column in columns)
+                select_list = ', '.join(f'CAST(s."{column}" AS {column_types[column]})' for column in columns)
+
+                if update_columns:
+                    set_list = ', '.join(f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+                    current_values = ', '.join(f't."{column}"' for column in update_columns)
+                    new_values = ', '.join(f'EXCLUDED."{column}"' for column in update_columns)
+                    conflict_action = f"DO UPDATE SET {set_list} WHERE ({current_values}) IS DISTINCT FROM ({new_values})"
+                else:
+                    conflict_action = "DO NOTHING"
+
+                # DISTINCT ON stops duplicate keys in the new data hitting the same row twice, and rows 
+                # whose keys were set to NULL by the casting are left out, as they are by add_primary_key
+                upsert_sql = f"""
+                INSERT INTO "{table_name}" AS t ({column_list})
+                SELECT DISTINCT ON ({', '.join(f's."{key}"' for key in keys)}) {select_list}
+                FROM "{staging_table}" s
+                WHERE {' AND '.join(f's."{key}" IS NOT NULL' for key in keys)}
+                ON CONFLICT ({key_list}) {conflict_action};
+                """
+                rows_written = connection.execute(text(upsert_sql)).rowcount
+                logging.info(f"Upserted {rows_written} new or changed rows into '{table_name}'.")
+        finally:
+            self.drop_table(engine, staging_table)
+
+        return rows_written
+
+    def get_column_types(self, connection, table_name):
+        """
+        Returns the columns of a table and their types, in column order.
+
+        Args:
+            connection: connection to the database (i.e. SQL Alchemy connection)
+            table_name (str): The name of the table.
+
+        Returns:
+            dict: The type of each column, e.g. {'product_price': 'double precision'}.
+        """
+        column_types_sql = """
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(:table_name) AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum;
+        """
+        return dict(connection.execute(text(column_types_sql), {'table_name': f'"{table_name}"'}).fetchall())
+
+    def widen_varchar_columns(self, connection, table_name, staging_table, column_types, columns):
+        """
+        Widens the VARCHAR(n) columns of a table that are too short for the values in a staging 
+        table, as data_casting.py sizes them to the longest value loaded so far.
+
+        Args:
+            connection: connection to the database (i.e. SQL Alchemy connection)
+            table_name (str): The name of the table.
+            staging_table (str): The name of the staging table.
+            column_types (dict): The column types of the table, from get_column_types.
+            columns (list): The columns being merged from the staging table.
+
+        Returns:
+            None
+        """
+        varchar_lengths = {}
+        for column in columns:
+            match = re.fullmatch(r'character varying\((\d+)\)', column_types[column])
+            if match:
+                varchar_lengths[column] = int(match.group(1))
+        if not varchar_lengths:
+            return
+
+        max_lengths_sql = ', '.join(f'MAX(LENGTH(CAST("{column}" AS TEXT)))' for column in varchar_lengths)
+        max_lengths = connection.execute(text(f'SELECT {max_lengths_sql} FROM "{staging_table}";')).fetchone()
+
+        for (column, length), max_length in zip(varchar_lengths.items(), max_lengths):
+            if max_length and max_length > length:
+                connection.execute(text(f'ALTER TABLE "{table_name}" ALTER COLUMN "{column}" TYPE VARCHAR({max_length});'))
+                column_types[column] = f'character varying({max_length})'
+                logging.info(f"Widened {table_name}.{column} to VARCHAR({max_length}) for the upserted values.")
+
+    def ensure_unique_index(self, connection, table_name, keys):
+        """
+        Creates a unique index on the key columns of a table, unless a primary key or unique 
+        index on exactly those columns already exists. ON CONFLICT needs one to match rows.
+
+        Args:
+            connection: connection to the database (i.e. SQL Alchemy connection)
+            table_name (str): The name of the table.
+            keys (list): The key columns.
+
+        Returns:
+            None
+        """
+        check_index_sql = """
+        SELECT 1
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(:table_name) AND i.indisunique
+        AND (
+            SELECT array_agg(a.attname::text ORDER BY a.attname::text)
+            FROM pg_attribute a
+            WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        ) = :keys;
+        """
+        index_exists = connection.execute(text(check_index_sql), {'table_name': f'"{table_name}"', 'keys': sorted(keys)}).fetchone()
+
+        if not index_exists:
+            key_list = ', '.join(f'"{key}"' for key in keys)
+            connection.execute(text(f'CREATE UNIQUE INDEX "{table_name}_upsert_key" ON "{table_name}" ({key_list});'))
+            logging.info(f"Unique index added to {table_name} on {keys} for upserts.")
+
+    def copy_to_db(self, engine, dataframe, table_name, chunk_size=None, schema=None, create=True):
+        """
+        Bulk loads a DataFrame into a table using COPY ... FROM STDIN. The table is (re)created 
+        from the DataFrame's columns with pandas, then the rows are streamed in as CSV chunks. 
+        Both run in one transaction, so a failed COPY leaves the previous table in place.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): The SQLAlchemy engine connected to the database.
+            dataframe (pd.DataFrame): The DataFrame to be loaded.
+            table_name (str): The name of the table to load into.
+            chunk_size (int, optional): The number of rows serialised per chunk.
+            schema (str, optional): The schema of the table. Defaults to the search path.
+            create (bool): Whether to (re)create the table first. If False, the rows are appended 
+                to the existing table.
+
+        Returns:
+            int: The number of rows loaded.
+        """
+
+        chunk_size = chunk_size or self.copy_chunk_size
+
+        qualified_name = f'"{schema}"."{table_name}"' if schema else f'"{table_name}"'
+        columns = ', '.join(f'"{column}"' for column in dataframe.columns)
+        copy_sql = f"COPY {qualified_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{DataFrameCSVStream.NULL_MARKER}')"
+
+        # the table is created and loaded in one transaction, committed once the COPY has succeeded
+        with engine.begin() as connection:
+            # create an empty table with the same columns and types that to_sql would use 
+            if create:
+                dataframe.head(0).to_sql(name=table_name, con=connection, schema=schema, if_exists='replace', index=False)
+
+            # COPY isn't exposed through SQLAlchemy, so it runs on the same connection's psycopg2 cursor
+            with connection.connection.cursor() as cursor:
+                cursor.copy_expert(copy_sql, DataFrameCSVStream(dataframe, chunk_size))
+
+        return len(dataframe)
 
     def drop_table(self, engine, table_name):
         """
@@ -182,7 +793,7 @@ class DatabaseConnector:
     
     def reset_database(self):
         """
-        Resets the database by dropping all tables defined in the `tables_to_drop` list.
+        Resets the database by dropping all tables defined in the `PIPELINE_TABLES` list.
 
         Args:
             None
@@ -197,18 +808,101 @@ class DatabaseConnector:
         engine = self.init_db_engine(prefix="DB")
 
         # Drop all tables
-        tables_to_drop = [
-            'orders_table',
-            'dim_products',
-            'dim_users',
-            'dim_store_details',
-            'dim_date_times',
-            'dim_card_details'
-        ]
-
-        for table in tables_to_drop:
+        for table in PIPELINE_TABLES:
             self.drop_table(engine, table)
 
+    def prepare_shadow_schema(self):
+        """
+        Creates an empty shadow schema for the 'shadow' load mode, dropping anything left 
+        over from an earlier, unfinished refresh. The live tables are not touched.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        logging.info('prepare_shadow_schema is working')
+
+        engine = self.init_db_engine(prefix="DB")
+
+        with engine.begin() as connection:
+            connection.execute(text(f'DROP SCHEMA IF EXISTS "{self.shadow_schema}" CASCADE;'))
+            connection.execute(text(f'CREATE SCHEMA "{self.shadow_schema}";'))
+
+    def swap_shadow_schema(self, lock_timeout='5s'):
+        """
+        Swaps the tables built in the shadow schema into the public schema in one transaction. 
+        The current live tables are moved to the previous schema (replacing the generation kept 
+        there before), so a refresh can be undone with rollback_shadow_swap. Constraints, 
+        indexes and foreign keys move with their tables.
 
+        Args:
+            lock_timeout (str): How long to wait for readers' locks before giving up on the swap.
 
+        Returns:
+            None
+        """
+
+        logging.info('swap_shadow_schema is working')
 
+        engine = self.init_db_engine(prefix="DB")
+
+        with engine.begin() as connection:
+            # fail fast rather than queueing readers behind the swap
+            connection.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}';"))
+
+            connection.execute(text(f'DROP SCHEMA IF EXISTS "{self.previous_schema}" CASCADE;'))
+            connection.execute(text(f'CREATE SCHEMA "{self.previous_schema}";'))
+
+            self.move_tables(connection, 'public', self.previous_schema)
+            self.move_tables(connection, self.shadow_schema, 'public')
+
+            connection.execute(text(f'DROP SCHEMA "{self.shadow_schema}";'))
+
+        logging.info(f"Swapped tables from '{self.shadow_schema}' into 'public', previous tables kept in '{self.previous_schema}'.")
+
+    def rollback_shadow_swap(self, lock_timeout='5s'):
+        """
+        Restores the previous generation of tables after a shadow swap. The current public 
+        tables are moved into the previous schema, so calling this again swaps them back.
+
+        Args:
+            lock_timeout (str): How long to wait for readers' locks before giving up on the swap.
+
+        Returns:
+            None
+        """
+
+        logging.info('rollback_shadow_swap is working')
+
+        engine = self.init_db_engine(prefix="DB")
+
+        with engine.begin() as connection:
+            connection.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}';"))
+
+            # park the current tables in the shadow schema while the previous ones move back
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{self.shadow_schema}";'))
+            self.move_tables(connection, 'public', self.shadow_schema)
+            self.move_tables(connection, self.previous_schema, 'public')
+            self.move_tables(connection, self.shadow_schema, self.previous_schema)
+            connection.execute(text(f'DROP SCHEMA "{self.shadow_schema}";'))
+
+        logging.info(f"Restored tables from '{self.previous_schema}' into 'public'.")
+
+    def move_tables(self, connection, from_schema, to_schema):
+        """
+        Moves every pipeline table that exists in one schema into another schema.
+
+        Args:
+            connection: connection to the database (i.e. SQL Alchemy connection)
+            from_schema (str): The schema the tables are currently in.
+            to_schema (str): The schema to move the tables to.
+
+        Returns:
+            None
+        """
+        for table in PIPELINE_TABLES:
+            if inspect(connection).has_table(table, schema=from_schema):
+                connection.execute(text(f'ALTER TABLE "{from_schema}"."{table}" SET SCHEMA "{to_schema}";'))
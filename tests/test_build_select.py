@@ -0,0 +1,67 @@
+"""
+Tests for build_select, which pushes column selection and row filters down into RDS queries.
+"""
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from sqlalchemy.dialects import postgresql
+
+from data_extraction import build_select
+
+
+@pytest.fixture
+def table():
+    return Table('legacy_users', MetaData(),
+                 Column('index', Integer),
+                 Column('first_name', String),
+                 Column('country_code', String))
+
+
+def compile_query(query):
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+def test_selects_every_column_by_default(table):
+    query, columns = build_select(table)
+
+    assert columns == ['index', 'first_name', 'country_code']
+    assert 'WHERE' not in compile_query(query).replace('WHERE true', '')
+
+
+def test_column_selection_and_exclusion(table):
+    _, columns = build_select(table, columns=['first_name', 'index'])
+    assert columns == ['first_name', 'index']
+
+    _, columns = build_select(table, exclude_columns=['index'])
+    assert columns == ['first_name', 'country_code']
+
+
+def test_not_null_with_marker_only_compares_text_columns(table):
+    query, _ = build_select(table, filters=[('*', 'not_null', 'NULL')])
+    sql = compile_query(query)
+
+    assert 'legacy_users.first_name IS NOT NULL' in sql
+    assert "legacy_users.first_name != 'NULL'" in sql
+    assert 'legacy_users.index IS NOT NULL' in sql
+    assert "legacy_users.index != 'NULL'" not in sql
+
+
+def test_value_filters(table):
+    query, _ = build_select(table, filters=[('country_code', 'in', ['GB', 'US']),
+                                            ('first_name', 'ne', 'x'),
+                                            ('first_name', 'regex', '^[A-Z]')])
+    sql = compile_query(query)
+
+    assert "legacy_users.country_code IN ('GB', 'US')" in sql
+    assert "legacy_users.first_name != 'x'" in sql
+    assert "legacy_users.first_name ~ '^[A-Z]'" in sql
+
+
+def test_distinct(table):
+    query, _ = build_select(table, columns=['country_code'], distinct=True)
+
+    assert compile_query(query).startswith('SELECT DISTINCT')
+
+
+def test_unknown_operator(table):
+    with pytest.raises(ValueError):
+        build_select(table, filters=[('index', 'between', (1, 2))])
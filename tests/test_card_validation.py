@@ -0,0 +1,91 @@
+"""
+Tests for validate_card_numbers, the vectorized card number checks.
+"""
+import pandas as pd
+import pytest
+
+from data_cleaning import validate_card_numbers
+
+
+def validate(cards, strict=True):
+    numbers, providers = zip(*cards)
+    return validate_card_numbers(pd.Series(numbers), pd.Series(providers), strict=strict)
+
+
+def test_valid_card_numbers_are_kept():
+    keep, reasons = validate([
+        ('4111111111111111', 'VISA 16 digit'),
+        ('378282246310005', 'American Express'),
+        ('5555555555554444', 'Mastercard'),
+        ('30569309025904', 'Diners Club / Carte Blanche'),
+        ('6759649826438453', 'Maestro'),
+    ])
+
+    assert keep.all()
+    assert reasons.isna().all()
+
+
+@pytest.mark.parametrize('number, provider, reason', [
+    ('4111?11111111111', 'VISA 16 digit', 'format'),
+    ('', 'VISA 16 digit', 'format'),
+    ('4111111111111', 'VISA 16 digit', 'length'),
+    ('4111111111111111', 'Unknown provider', 'length'),
+    ('4111111111111112', 'VISA 16 digit', 'checksum'),
+])
+def test_rejection_reasons(number, provider, reason):
+    keep, reasons = validate([(number, provider), ('4111111111111111', 'VISA 16 digit')])
+
+    assert keep.tolist() == [False, True]
+    assert reasons.tolist() == [reason, None]
+
+
+def test_non_strict_only_checks_the_format():
+    keep, reasons = validate([('4111111111111112', 'VISA 16 digit'), ('12ab', 'Maestro')], strict=False)
+
+    assert keep.tolist() == [True, False]
+    assert reasons.tolist() == [None, 'format']
+
+
+def test_keeps_the_index_and_handles_numbers_of_different_lengths():
+    numbers = pd.Series(['378282246310005', '4111111111111111', '6304000000000000'], index=[7, 3, 5])
+    providers = pd.Series(['American Express', 'VISA 16 digit', 'Maestro'], index=[7, 3, 5], dtype='category')
+
+    keep, reasons = validate_card_numbers(numbers, providers)
+
+    assert keep.index.tolist() == [7, 3, 5]
+    assert keep.tolist() == [True, True, True]
+
+
+@pytest.fixture
+def card_details(monkeypatch):
+    import data_cleaning
+    df = pd.DataFrame({
+        'card_number': ['4111111111111111', '??378282246310005', '4111111111111112', 'ABCDEF'],
+        'expiry_date': ['01/25', '02/26', '03/27', '04/28'],
+        'card_provider': ['VISA 16 digit', 'American Express', 'VISA 16 digit', 'Mastercard'],
+        'date_payment_confirmed': ['2015-11-25', '2001-06-18', '2000-12-26', '2011-02-12'],
+    })
+    monkeypatch.setattr(data_cleaning.DataExtractor, 'retrieve_pdf_data', lambda self, pdf_path: df.copy())
+
+
+def test_clean_card_data_keeps_the_rejected_cards(card_details, monkeypatch):
+    from data_cleaning import DataCleaning
+    monkeypatch.setenv('STRICT_CARD_VALIDATION', 'true')
+    cleaning = DataCleaning()
+
+    cleaned = cleaning.clean_card_data()
+
+    assert cleaned['card_number'].tolist() == ['4111111111111111', '378282246310005']
+    assert cleaning.rejected_cards['card_number'].tolist() == ['4111111111111112', 'ABCDEF']
+    assert cleaning.rejected_cards['reason'].tolist() == ['checksum', 'format']
+
+
+def test_strict_card_validation_is_off_by_default(card_details, monkeypatch):
+    from data_cleaning import DataCleaning
+    monkeypatch.delenv('STRICT_CARD_VALIDATION', raising=False)
+    cleaning = DataCleaning()
+
+    cleaned = cleaning.clean_card_data()
+
+    assert cleaned['card_number'].tolist() == ['4111111111111111', '378282246310005', '4111111111111112']
+    assert cleaning.rejected_cards['reason'].tolist() == ['format']
@@ -0,0 +1,111 @@
+"""
+Tests for CleaningPlan, _map_unique and the cleaning rules of the cards, stores and products data.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaning import CleaningPlan, _map_unique, PRODUCTS_RULES, STORE_DETAILS_RULES
+
+
+def test_transforms_run_before_the_checks_of_a_column():
+    plan = CleaningPlan([
+        {'column': 'removed', 'rule': 'isin', 'values': ['Still_available', 'Removed']},
+        {'column': 'removed', 'rule': 'replace', 'mapping': {'Still_avaliable': 'Still_available'}},
+    ])
+    df = pd.DataFrame({'removed': ['Still_avaliable', 'Removed', 'junk']})
+
+    cleaned = plan.apply(df)
+
+    assert cleaned['removed'].tolist() == ['Still_available', 'Removed']
+
+
+def test_checks_of_a_column_are_combined():
+    plan = CleaningPlan([
+        {'column': 'code', 'rule': 'match', 'pattern': r'^[A-Z]+$'},
+        {'column': 'code', 'rule': 'match', 'pattern': r'^.{2}$'},
+        {'column': 'code', 'rule': 'not_contains', 'pattern': 'X'},
+        {'column': 'code', 'rule': 'not_in', 'values': ['ZZ']},
+    ])
+    df = pd.DataFrame({'code': ['GB', 'GBR', 'gb', 'XY', 'ZZ', None, 'DE']})
+
+    assert plan.apply(df)['code'].tolist() == ['GB', 'DE']
+
+
+def test_remove_chars_and_dates():
+    plan = CleaningPlan([
+        {'column': 'card_number', 'rule': 'remove_chars', 'chars': '?'},
+        {'column': 'date', 'rule': 'date'},
+    ])
+    df = pd.DataFrame({'card_number': ['??4111', '4222'], 'date': ['2005 December 02', 'soon']})
+
+    cleaned = plan.apply(df)
+
+    assert cleaned['card_number'].tolist() == ['4111']
+    assert cleaned['date'].tolist() == ['2005-12-02']
+
+
+def test_exempt_rows_are_kept():
+    plan = CleaningPlan([{'column': 'locality', 'rule': 'match', 'pattern': r'^[a-zA-Z\s-]+$', 'exempt': [0]}])
+    df = pd.DataFrame({'locality': [None, 'High Wycombe', '3IMJ4T']})
+
+    assert plan.apply(df).index.tolist() == [0, 1]
+
+
+def test_categorical_columns():
+    plan = CleaningPlan(PRODUCTS_RULES)
+    df = pd.DataFrame({
+        'removed': pd.Series(['Still_avaliable', 'Removed', 'N9D2BZQX63'], dtype='category'),
+        'category': pd.Series(['toys-and-games', 'diy', 'N9D2BZQX63'], dtype='category'),
+        'date_added': ['2005-12-02', '2006/01/03', 'N9D2BZQX63'],
+    })
+
+    cleaned = plan.apply(df)
+
+    assert cleaned['removed'].tolist() == ['Still_available', 'Removed']
+    assert cleaned['date_added'].tolist() == ['2005-12-02', '2006-01-03']
+
+
+def test_store_details_rules():
+    df = pd.DataFrame({
+        'lat': [None, '51.62907', 'NULL', 'QIUU9SVP51'],
+        'continent': ['Europe', 'eeEurope', 'Europe', 'Europe'],
+        'locality': [None, 'High Wycombe', 'NULL', 'Oxford'],
+        'opening_date': ['2002-05-03', 'May 2003 27', '2003-01-01', '2003-01-01'],
+    })
+
+    cleaned = CleaningPlan(STORE_DETAILS_RULES).apply(df)
+
+    assert cleaned.index.tolist() == [0, 1]
+    assert cleaned['continent'].tolist() == ['Europe', 'Europe']
+    assert cleaned['opening_date'].tolist() == ['2002-05-03', '2003-05-27']
+
+
+def test_unknown_rule():
+    with pytest.raises(ValueError):
+        CleaningPlan([{'column': 'lat', 'rule': 'between'}])
+
+
+def test_map_unique_calls_the_function_once_per_distinct_value():
+    calls = []
+
+    def func(value):
+        calls.append(value)
+        return value
+
+    _map_unique(pd.Series(['a', 'b', 'a', 'b', np.nan], index=[5, 4, 3, 2, 1]), func)
+
+    # once for each distinct value, and once for missing values
+    assert len(calls) == 3
+
+
+def test_map_unique_keeps_the_index():
+    result = _map_unique(pd.Series(['a', 'b', 'a'], index=[9, 8, 7]), str.upper)
+
+    assert result.to_dict() == {9: 'A', 8: 'B', 7: 'A'}
+
+
+def test_map_unique_with_missing_values():
+    result = _map_unique(pd.Series(['a', None, 'a']), lambda value: value.upper() if isinstance(value, str) else 'missing')
+
+    assert result.tolist() == ['A', 'missing', 'A']
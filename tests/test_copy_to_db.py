@@ -0,0 +1,55 @@
+"""
+Tests for DatabaseConnector.copy_to_db, the COPY-based loader, against a real Postgres database.
+
+These tests drop and recreate the pipeline tables, so they only run when TEST_DATABASE is set 
+to 'true' and the DB_* (and RDS_*, API_KEY) environment variables point at a throwaway database.
+"""
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from database_utils import DataFrameCSVStream
+
+pytestmark = pytest.mark.skipif(os.getenv('TEST_DATABASE', '').lower() != 'true',
+                                reason="set TEST_DATABASE=true to run the database tests")
+
+
+@pytest.fixture
+def connector():
+    from database_utils import DatabaseConnector
+    instance = DatabaseConnector()
+    engine = instance.init_db_engine(prefix="DB")
+    instance.drop_table(engine, 'dim_date_times')
+    yield instance
+    instance.drop_table(engine, 'dim_date_times')
+
+
+def read_table(engine):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text('SELECT time_period, date_uuid FROM dim_date_times ORDER BY date_uuid'))]
+
+
+def test_copy_keeps_empty_strings_and_nulls(connector):
+    engine = connector.init_db_engine(prefix="DB")
+    df = pd.DataFrame({'time_period': ['', None, 'Evening'], 'date_uuid': ['a', 'b', 'c']})
+
+    assert connector.copy_to_db(engine, df, 'dim_date_times', chunk_size=2) == 3
+
+    assert read_table(engine) == [('', 'a'), (None, 'b'), ('Evening', 'c')]
+
+
+def test_failed_copy_keeps_the_previous_table(connector, monkeypatch):
+    engine = connector.init_db_engine(prefix="DB")
+    connector.copy_to_db(engine, pd.DataFrame({'time_period': ['Morning'], 'date_uuid': ['a']}), 'dim_date_times')
+
+    # the stream fails part way, as it would if the connection dropped
+    def fail(self, size=-1):
+        raise OSError('connection lost')
+    monkeypatch.setattr(DataFrameCSVStream, 'read', fail)
+
+    with pytest.raises(Exception):
+        connector.copy_to_db(engine, pd.DataFrame({'time_period': ['Evening'], 'date_uuid': ['b']}), 'dim_date_times')
+
+    assert read_table(engine) == [('Morning', 'a')]
@@ -0,0 +1,62 @@
+"""
+Tests for DataFrameCSVStream, the file-like source that COPY-based uploads read from.
+"""
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database_utils import DataFrameCSVStream
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'name': ['a', '', None, 'd, "quoted"', 'e'],
+        'value': [1.5, np.nan, 3.0, 4.0, 5.0]
+    })
+
+
+def test_read_all_matches_to_csv(df):
+    stream = DataFrameCSVStream(df, chunk_size=2)
+
+    assert stream.read() == df.to_csv(header=False, index=False, na_rep=DataFrameCSVStream.NULL_MARKER)
+    assert stream.rows_written == len(df)
+    assert stream.read() == ''
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 1000])
+def test_sized_reads_cross_chunks(df, size):
+    stream = DataFrameCSVStream(df, chunk_size=2)
+
+    parts = []
+    while True:
+        data = stream.read(size)
+        if not data:
+            break
+        assert len(data) <= size
+        parts.append(data)
+
+    assert ''.join(parts) == DataFrameCSVStream(df, chunk_size=2).read()
+
+
+def test_readline_returns_one_row_at_a_time(df):
+    stream = DataFrameCSVStream(df, chunk_size=2)
+
+    lines = iter(stream.readline, '')
+
+    assert list(lines) == DataFrameCSVStream(df).read().splitlines(keepends=True)
+
+
+def test_missing_values_use_the_null_marker_and_empty_strings_stay_empty(df):
+    rows = list(csv.reader(io.StringIO(DataFrameCSVStream(df).read())))
+
+    assert rows[1] == ['', DataFrameCSVStream.NULL_MARKER]
+    assert rows[2][0] == DataFrameCSVStream.NULL_MARKER
+    assert rows[3][0] == 'd, "quoted"'
+
+
+def test_empty_dataframe():
+    assert DataFrameCSVStream(pd.DataFrame({'name': []})).read() == ''
@@ -0,0 +1,73 @@
+"""
+Tests for FrameCache, the local cache of parsed S3 files and PDF tables.
+"""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from data_extraction import FrameCache
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'product_name': ['a', 'b'], 'weight': ['1kg', '200g']})
+
+
+def test_put_then_get(tmp_path, df):
+    cache = FrameCache(str(tmp_path))
+
+    cache.put('s3://bucket/products.csv', df, bucket='bucket', key='products.csv', etag='"abc"')
+
+    pd.testing.assert_frame_equal(cache.get('s3://bucket/products.csv'), df)
+    assert cache.get('s3://bucket/other.csv') is None
+
+
+def test_mixed_type_columns_fall_back_to_a_pickle(tmp_path):
+    cache = FrameCache(str(tmp_path))
+    df = pd.DataFrame({'value': [1, 'a', 2.5]}, dtype=object)
+
+    cache.put('mixed', df)
+
+    assert cache.get('mixed')['value'].tolist() == [1, 'a', 2.5]
+
+
+def test_expired_entries_are_removed(tmp_path, df):
+    cache = FrameCache(str(tmp_path), max_age=60)
+    cache.put('old', df)
+
+    index = cache._load_index()
+    index['old']['created'] -= 120
+    cache._save_index(index)
+
+    assert cache.get('old') is None
+    assert os.listdir(tmp_path) == ['index.json']
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path, df):
+    cache = FrameCache(str(tmp_path))
+    cache.put('first', df)
+    cache.put('second', df)
+    entry_size = cache._load_index()['first']['size']
+
+    # using 'first' makes 'second' the least recently used entry
+    time.sleep(0.01)
+    cache.get('first')
+    cache.max_bytes = entry_size * 2
+    cache.put('third', df)
+
+    assert set(cache._load_index()) == {'first', 'third'}
+
+
+def test_find_latest_matches_metadata(tmp_path, df):
+    cache = FrameCache(str(tmp_path))
+    cache.put('v1', df, bucket='bucket', key='products.csv')
+    time.sleep(0.01)
+    cache.put('v2', df, bucket='bucket', key='products.csv')
+
+    key, age = cache.find_latest(bucket='bucket', key='products.csv')
+
+    assert key == 'v2'
+    assert age >= 0
+    assert cache.find_latest(bucket='bucket', key='dates.json') == (None, None)
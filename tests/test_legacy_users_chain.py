@@ -0,0 +1,56 @@
+"""
+Tests for the chained legacy users cleaning methods, which defer their filters to one pending mask.
+"""
+import pandas as pd
+
+from data_cleaning import DataCleaning, optimize_dtypes
+
+
+def legacy_users():
+    return pd.DataFrame({
+        'first_name': [' Ánna ', 'Bob', 'Cara', 'Dan', 'Eve'],
+        'last_name': ['Smith', 'JONES', 'Lee', 'Kim', 'Ray'],
+        'country': ['United Kingdom', 'Germany', 'United States', 'I7G4DMDZOZ', 'Germany'],
+        'country_code': ['GGB', 'DE', 'US', 'QREF9WLI2A', 'DE'],
+        'date_of_birth': ['1990-01-02', '1985/05/06', 'not a date', '1970-01-01', '1960 March 03'],
+        'join_date': ['2020-02-03', '2019-07-08', '2018-01-01', '2017-01-01', 'never'],
+    }, index=[10, 11, 12, 13, 14])
+
+
+def test_chained_filters_match_eager_filtering():
+    cleaned = (DataCleaning(legacy_users())
+               .clean_country_codes()
+               .remove_garbage()
+               .clean_country_names()
+               .cleaning_text_fields()
+               .clean_dob_and_join_date()
+               .df)
+
+    assert cleaned.index.tolist() == [10, 11]
+    assert cleaned['country_code'].tolist() == ['GB', 'DE']
+    assert cleaned['first_name'].tolist() == ['anna', 'bob']
+    assert cleaned['last_name'].tolist() == ['smith', 'jones']
+    assert cleaned['date_of_birth'].tolist() == ['1990-01-02', '1985-05-06']
+    assert cleaned['join_date'].tolist() == ['2020-02-03', '2019-07-08']
+
+
+def test_filters_are_applied_when_df_is_read():
+    cleaning = DataCleaning(legacy_users()).remove_garbage()
+
+    assert len(cleaning._frame) == 5
+    assert cleaning.df.index.tolist() == [11, 12, 14]
+    assert cleaning._mask is None
+
+    # later filters apply to the rows still kept
+    assert cleaning.clean_dob_and_join_date().df.index.tolist() == [11]
+
+
+def test_setting_a_categorical_column_after_a_filter():
+    df = optimize_dtypes(legacy_users().astype(object), categories=['country_code', 'country'])
+
+    cleaned = DataCleaning(df).clean_country_names().clean_country_codes().cleaning_text_fields().df
+
+    assert cleaned.index.tolist() == [10, 11, 12, 14]
+    assert isinstance(cleaned['country_code'].dtype, pd.CategoricalDtype)
+    assert cleaned['country_code'].tolist() == ['GB', 'DE', 'US', 'DE']
+    assert cleaned['first_name'].tolist() == ['anna', 'bob', 'cara', 'eve']
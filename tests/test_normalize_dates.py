@@ -0,0 +1,46 @@
+"""
+Tests for normalize_dates, the date parser shared by the cleaning methods.
+"""
+import numpy as np
+import pandas as pd
+
+from data_cleaning import normalize_dates
+
+
+def test_known_formats_and_dateutil_fallback():
+    series = pd.Series(['2005-12-02', '2005/12/02', '2005 December 02', 'December 2005 02', '02 Dec 2005'])
+
+    result, rejected = normalize_dates(series)
+
+    assert result.tolist() == ['2005-12-02'] * 5
+    assert not rejected.any()
+
+
+def test_invalid_and_missing_dates_are_rejected():
+    series = pd.Series(['2005-12-02', 'GFW2NH3SQ5', None, np.nan, '2005-13-45'], index=[10, 11, 12, 13, 14])
+
+    result, rejected = normalize_dates(series)
+
+    assert result.index.tolist() == [10, 11, 12, 13, 14]
+    assert result[10] == '2005-12-02'
+    assert rejected.tolist() == [False, True, True, True, True]
+    assert result[rejected].isna().all()
+
+
+def test_repeated_values_map_back_to_every_row():
+    series = pd.Series(['1999/01/31', 'x', '1999/01/31', 'x'])
+
+    result, rejected = normalize_dates(series)
+
+    assert result[[0, 2]].tolist() == ['1999-01-31'] * 2
+    assert result[[1, 3]].isna().all()
+    assert rejected.tolist() == [False, True, False, True]
+
+
+def test_categorical_input():
+    series = pd.Series(['2005-12-02', 'July 2001 13', '2005-12-02'], dtype='category')
+
+    result, rejected = normalize_dates(series)
+
+    assert result.tolist() == ['2005-12-02', '2001-07-13', '2005-12-02']
+    assert not rejected.any()
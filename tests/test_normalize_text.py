@@ -0,0 +1,26 @@
+"""
+Tests for normalize_text, which cleans the name fields once per distinct value.
+"""
+import pandas as pd
+
+from data_cleaning import normalize_text
+
+
+def test_lower_case_strip_and_transliterate():
+    series = pd.Series([' Ánna ', 'BOB', 'Zoë', None])
+
+    result = normalize_text(series)
+
+    assert result[:3].tolist() == ['anna', 'bob', 'zoe']
+    assert pd.isna(result[3])
+
+
+def test_keeps_categorical_and_string_dtypes():
+    categorical = normalize_text(pd.Series(['Ánna', 'Ánna', 'Bob'], dtype='category'))
+    string = normalize_text(pd.Series(['Ánna', None], dtype='string'))
+
+    assert isinstance(categorical.dtype, pd.CategoricalDtype)
+    assert categorical.tolist() == ['anna', 'anna', 'bob']
+    assert string.dtype == 'string'
+    assert string[0] == 'anna' and pd.isna(string[1])
+
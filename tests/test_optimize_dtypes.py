@@ -0,0 +1,41 @@
+"""
+Tests for optimize_dtypes, which converts extracted frames to compact dtypes before cleaning.
+"""
+import pandas as pd
+
+from data_cleaning import STRING_DTYPE, optimize_dtypes
+
+
+def test_converts_categories_strings_and_integers():
+    df = pd.DataFrame({
+        'country_code': ['GB', 'DE', 'GB'],
+        'first_name': pd.Series(['anna', 'bob', 'cara'], dtype=object),
+        'index': pd.Series([1, 2, 3], dtype='int64'),
+        'price': [1.5, 2.5, 3.5],
+    })
+
+    optimized = optimize_dtypes(df, categories=['country_code'])
+
+    assert isinstance(optimized['country_code'].dtype, pd.CategoricalDtype)
+    assert optimized['first_name'].dtype == pd.Series([], dtype=STRING_DTYPE).dtype
+    assert optimized['index'].dtype == 'int8'
+    assert optimized['price'].dtype == 'float64'
+    assert optimized['first_name'].tolist() == ['anna', 'bob', 'cara']
+
+
+def test_excluded_columns_are_left_alone():
+    df = pd.DataFrame({'staff_numbers': pd.Series([1, 'J78', 3], dtype=object),
+                       'index': pd.Series([1, 2, 3], dtype='int64')})
+
+    optimized = optimize_dtypes(df, exclude=['staff_numbers', 'index'])
+
+    assert optimized['staff_numbers'].dtype == object
+    assert optimized['index'].dtype == 'int64'
+
+
+def test_missing_values_survive():
+    df = pd.DataFrame({'country': ['Germany', None]}, dtype=object)
+
+    optimized = optimize_dtypes(df, categories=['country'])
+
+    assert optimized['country'].isna().tolist() == [False, True]
@@ -0,0 +1,82 @@
+"""
+Tests for the range partitions of DataExtractor.read_data_from_table: every row must fall into 
+exactly one partition. Numeric partitions are checked on SQLite; the ctid partitions need a real 
+Postgres database, so they only run when TEST_DATABASE is set to 'true'.
+"""
+import os
+
+import pytest
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_engine, func, insert, select, text
+
+from data_extraction import DataExtractor
+
+
+def partition_counts(engine, table, partition_column, partitions):
+    with engine.connect() as connection:
+        conditions = DataExtractor()._partition_conditions(connection, table, partition_column, partitions)
+        return [connection.execute(select(func.count()).select_from(table).where(condition)).scalar()
+                for condition in conditions]
+
+
+@pytest.fixture
+def engine():
+    return create_engine('sqlite://')
+
+
+def make_table(engine, values, column_type=Integer):
+    table = Table('orders_table', MetaData(), Column('index', column_type))
+    table.create(engine)
+    with engine.begin() as connection:
+        if values:
+            connection.execute(insert(table), [{'index': value} for value in values])
+    return table
+
+
+@pytest.mark.parametrize('partitions', [1, 2, 3, 8, 200])
+def test_integer_partitions_cover_every_row_once(engine, partitions):
+    table = make_table(engine, list(range(100)) + [None, None])
+
+    counts = partition_counts(engine, table, 'index', partitions)
+
+    assert sum(counts) == 102
+    assert len(counts) <= partitions
+    assert all(count > 0 for count in counts)
+
+
+def test_float_partitions(engine):
+    table = make_table(engine, [0.5, 1.25, 2.0, 7.75, 9.5], Float)
+
+    assert sum(partition_counts(engine, table, 'index', 4)) == 5
+
+
+def test_a_single_value_is_one_partition(engine):
+    table = make_table(engine, [7, 7, 7])
+
+    assert partition_counts(engine, table, 'index', 4) == [3]
+
+
+def test_empty_table_is_one_partition(engine):
+    table = make_table(engine, [])
+
+    assert partition_counts(engine, table, 'index', 4) == [0]
+
+
+@pytest.mark.skipif(os.getenv('TEST_DATABASE', '').lower() != 'true',
+                    reason="set TEST_DATABASE=true to run the database tests")
+@pytest.mark.parametrize('partitions', [1, 3, 8])
+def test_ctid_partitions_cover_every_row_once(partitions):
+    from database_utils import DatabaseConnector
+    engine = DatabaseConnector().init_db_engine(prefix="DB")
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS test_partitions'))
+        connection.execute(text('CREATE TABLE test_partitions AS SELECT generate_series(1, 20000) AS "index"'))
+    table = Table('test_partitions', MetaData(), Column('index', Integer))
+
+    try:
+        counts = partition_counts(engine, table, 'ctid', partitions)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text('DROP TABLE test_partitions'))
+
+    assert sum(counts) == 20000
+    assert len(counts) == partitions
@@ -0,0 +1,53 @@
+"""
+Tests for parse_retry_after and the TokenBucket rate limiter used by the async store fetch.
+"""
+import time
+from email.utils import formatdate
+
+import pytest
+
+from data_extraction import TokenBucket, parse_retry_after
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('5', 5.0),
+    ('0', 0.0),
+    ('2.5', 2.5),
+    ('-3', 0.0),
+    (None, None),
+    ('', None),
+    ('soon', None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    wait_time = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+
+    assert 25 <= wait_time <= 30
+
+
+def test_parse_retry_after_past_http_date():
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_throttle_halves_the_rate_and_recover_restores_it():
+    bucket = TokenBucket(10, min_rate=4)
+
+    bucket.throttle()
+    assert bucket.rate == 5
+    bucket.throttle()
+    assert bucket.rate == 4
+
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 10
+
+
+def test_throttle_with_retry_after_blocks_the_bucket():
+    bucket = TokenBucket(10)
+
+    bucket.throttle(retry_after=30)
+
+    assert bucket.blocked_until - time.monotonic() > 25
@@ -0,0 +1,117 @@
+"""
+Tests for reading S3 files of each supported format, and for extract_from_s3's local cache.
+"""
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+import data_extraction
+from data_extraction import DataExtractor, FrameCache, detect_file_format, read_file
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'year': ['1999', '2005', '2010'], 'product_code': ['a', 'b', 'c']})
+
+
+@pytest.mark.parametrize('key, expected', [
+    ('products.csv', ('csv', None)),
+    ('folder/products.CSV.gz', ('csv', 'gzip')),
+    ('date_details.json', ('json', None)),
+    ('events.ndjson.zst', ('jsonl', 'zstd')),
+    ('products.parquet', ('parquet', None)),
+    ('products.pq', ('parquet', None)),
+    ('products.arrow', ('feather', None)),
+])
+def test_detect_file_format(key, expected):
+    assert detect_file_format(key) == expected
+
+
+@pytest.mark.parametrize('key', ['products', 'products.xlsx', 'products.gz', 'folder.csv/products'])
+def test_detect_file_format_unsupported(key):
+    with pytest.raises(ValueError):
+        detect_file_format(key)
+
+
+def test_read_text_formats(df):
+    csv = df.to_csv(index=False).encode()
+
+    pd.testing.assert_frame_equal(read_file(io.BytesIO(csv), 'products.csv'), df.astype({'year': 'int64'}))
+    pd.testing.assert_frame_equal(read_file(io.BytesIO(gzip.compress(csv)), 'products.csv.gz'), df.astype({'year': 'int64'}))
+    assert read_file(io.BytesIO(df.to_json(orient='records', lines=True).encode()), 'products.jsonl')['product_code'].tolist() == ['a', 'b', 'c']
+    assert read_file(io.BytesIO(df.to_json().encode()), 'products.json')['product_code'].tolist() == ['a', 'b', 'c']
+
+
+def test_read_columnar_formats_with_columns_and_filters(df):
+    parquet = io.BytesIO()
+    df.to_parquet(parquet, row_group_size=1)
+    feather = io.BytesIO()
+    df.to_feather(feather)
+
+    parquet.seek(0)
+    filtered = read_file(parquet, 'products.parquet', columns=['product_code'], filters=[('year', '>=', '2005')])
+    feather.seek(0)
+    projected = read_file(feather, 'products.feather', columns=['product_code'])
+
+    assert filtered.columns.tolist() == ['product_code']
+    assert filtered['product_code'].tolist() == ['b', 'c']
+    assert projected['product_code'].tolist() == ['a', 'b', 'c']
+
+
+class FakeS3:
+    """
+    A stand-in for the boto3 S3 client, serving in-memory objects. HEAD requests fail when offline.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.offline = False
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        if self.offline:
+            raise ClientError({'Error': {'Code': '503', 'Message': 'Service Unavailable'}}, 'HeadObject')
+        return {'ETag': '"etag-1"', 'ContentLength': len(self.objects[Key])}
+
+    def download_fileobj(self, bucket, key, buffer):
+        self.downloads += 1
+        buffer.write(self.objects[key])
+
+
+@pytest.fixture
+def extractor(tmp_path, df, monkeypatch):
+    parquet = io.BytesIO()
+    df.to_parquet(parquet)
+    s3 = FakeS3({'products.parquet': parquet.getvalue()})
+    monkeypatch.setattr(data_extraction, 'get_s3_client', lambda: s3)
+
+    instance = DataExtractor()
+    instance.s3_cache = FrameCache(str(tmp_path))
+    instance.s3_multipart_threshold = None
+    return instance, s3
+
+
+def test_unchanged_file_is_loaded_from_the_cache(extractor, df):
+    instance, s3 = extractor
+
+    instance.extract_from_s3('s3://bucket/products.parquet')
+    cached = instance.extract_from_s3('s3://bucket/products.parquet')
+
+    assert s3.downloads == 1
+    pd.testing.assert_frame_equal(cached, df)
+
+
+def test_offline_fallback_matches_the_columns_and_filters(extractor, df):
+    instance, s3 = extractor
+    instance.extract_from_s3('s3://bucket/products.parquet', columns=['product_code'], filters=[('year', '>=', '2005')])
+    s3.offline = True
+
+    # a projected, filtered copy can't stand in for the whole file
+    with pytest.raises(ClientError):
+        instance.extract_from_s3('s3://bucket/products.parquet')
+
+    cached = instance.extract_from_s3('s3://bucket/products.parquet', columns=['product_code'], filters=[('year', '>=', '2005')])
+    assert cached['product_code'].tolist() == ['b', 'c']
@@ -0,0 +1,108 @@
+"""
+Tests for download_s3_ranges, the parallel ranged download of large S3 files, against a fake S3 client.
+"""
+import io
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from data_extraction import download_s3_ranges
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class FakeS3:
+    """
+    A stand-in for the boto3 S3 client serving DATA, where every `fail_every`th get_object fails.
+    """
+
+    def __init__(self, fail_every=None, etag='etag-1'):
+        self.fail_every = fail_every
+        self.etag = etag
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket, Key, Range, IfMatch=None):
+        with self._lock:
+            self.requests.append(Range)
+            failing = self.fail_every and len(self.requests) % self.fail_every == 0
+        if failing:
+            raise ClientError({'Error': {'Code': '503', 'Message': 'Slow Down'}}, 'GetObject')
+        if IfMatch is not None and IfMatch != self.etag:
+            raise ClientError({'Error': {'Code': '412', 'Message': 'Precondition Failed'}}, 'GetObject')
+        start, end = map(int, Range[len('bytes='):].split('-'))
+        return {'Body': io.BytesIO(DATA[start:end + 1])}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    import data_extraction
+    monkeypatch.setattr(data_extraction.time, 'sleep', lambda seconds: None)
+
+
+def test_ranges_are_assembled_in_order():
+    s3 = FakeS3()
+
+    with download_s3_ranges(s3, 'bucket', 'products.csv', len(DATA), 'etag-1', part_size=1000, max_workers=4) as buffer:
+        assert buffer.read() == DATA
+
+    assert len(s3.requests) == 11
+
+
+def test_only_failed_ranges_are_fetched_again():
+    s3 = FakeS3(fail_every=3)
+
+    with download_s3_ranges(s3, 'bucket', 'products.csv', len(DATA), part_size=1000, max_workers=1) as buffer:
+        assert buffer.read() == DATA
+
+    # every range is requested once, then only the ranges whose request failed (the 3rd, 6th and 
+    # 9th) are requested again, until the 3rd range gets through on its 4th attempt
+    assert len(set(s3.requests[:11])) == 11
+    assert s3.requests[11:] == ['bytes=2000-2999', 'bytes=5000-5999', 'bytes=8000-8999', 'bytes=2000-2999', 'bytes=2000-2999']
+
+
+def test_gives_up_after_max_attempts():
+    s3 = FakeS3(fail_every=1)
+
+    with pytest.raises(RuntimeError, match='11 ranges'):
+        download_s3_ranges(s3, 'bucket', 'products.csv', len(DATA), part_size=1000, max_attempts=3)
+
+    assert len(s3.requests) == 33
+
+
+def test_changed_object_fails():
+    s3 = FakeS3(etag='etag-2')
+
+    with pytest.raises(RuntimeError):
+        download_s3_ranges(s3, 'bucket', 'products.csv', len(DATA), 'etag-1', part_size=4096, max_attempts=2)
+
+
+def test_large_objects_are_assembled_in_a_temporary_file(monkeypatch):
+    import data_extraction
+    temp_files = []
+    temporary_file = data_extraction.tempfile.TemporaryFile
+
+    def tracked_temporary_file(*args, **kwargs):
+        temp_files.append(temporary_file(*args, **kwargs))
+        return temp_files[-1]
+    monkeypatch.setattr(data_extraction.tempfile, 'TemporaryFile', tracked_temporary_file)
+
+    with download_s3_ranges(FakeS3(), 'bucket', 'products.csv', len(DATA), part_size=1000, memory_limit=4096) as buffer:
+        buffer.seek(5000)
+        assert buffer.read(10) == DATA[5000:5010]
+        buffer.seek(0)
+        assert buffer.read() == DATA
+
+    assert len(temp_files) == 1
+
+
+def test_small_objects_stay_in_memory(monkeypatch):
+    import data_extraction
+
+    def no_temporary_file(*args, **kwargs):
+        raise AssertionError('a temporary file was created')
+    monkeypatch.setattr(data_extraction.tempfile, 'TemporaryFile', no_temporary_file)
+
+    with download_s3_ranges(FakeS3(), 'bucket', 'products.csv', len(DATA), part_size=1000) as buffer:
+        assert buffer.read() == DATA
@@ -0,0 +1,76 @@
+"""
+Tests for the 'shadow' load mode against a real Postgres database: the tables are built in the 
+shadow schema and swapped into place, keeping the previous generation for a rollback.
+
+These tests drop and recreate the pipeline tables, so they only run when TEST_DATABASE is set 
+to 'true' and the DB_* (and RDS_*, API_KEY) environment variables point at a throwaway database.
+"""
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+pytestmark = pytest.mark.skipif(os.getenv('TEST_DATABASE', '').lower() != 'true',
+                                reason="set TEST_DATABASE=true to run the database tests")
+
+
+@pytest.fixture
+def connector():
+    from database_utils import DatabaseConnector
+    instance = DatabaseConnector()
+    instance.shadow_schema = 'test_shadow'
+    instance.previous_schema = 'test_previous'
+    engine = instance.init_db_engine(prefix="DB")
+
+    def clean_up():
+        instance.drop_table(engine, 'dim_date_times')
+        with engine.begin() as connection:
+            for schema in (instance.shadow_schema, instance.previous_schema):
+                connection.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE;'))
+
+    clean_up()
+    yield instance
+    clean_up()
+
+
+def date_times(*uuids):
+    return pd.DataFrame({'timestamp': ['22:00:06'] * len(uuids), 'date_uuid': list(uuids)})
+
+
+def read_uuids(engine, schema='public'):
+    with engine.connect() as connection:
+        return connection.execute(text(f'SELECT date_uuid FROM "{schema}".dim_date_times ORDER BY date_uuid')).scalars().all()
+
+
+def test_shadow_load_is_only_visible_after_the_swap(connector):
+    engine = connector.init_db_engine(prefix="DB")
+    assert connector.upload_to_db(date_times('a', 'b'), 'dim_date_times', mode='replace')
+
+    connector.prepare_shadow_schema()
+    assert connector.upload_to_db(date_times('c'), 'dim_date_times', mode='shadow')
+
+    # readers still see the live table while the shadow one is built
+    assert read_uuids(engine) == ['a', 'b']
+    assert read_uuids(engine, connector.shadow_schema) == ['c']
+
+    connector.swap_shadow_schema()
+
+    assert read_uuids(engine) == ['c']
+    assert read_uuids(engine, connector.previous_schema) == ['a', 'b']
+
+
+def test_rollback_restores_the_previous_tables(connector):
+    engine = connector.init_db_engine(prefix="DB")
+    assert connector.upload_to_db(date_times('a'), 'dim_date_times', mode='replace')
+    connector.prepare_shadow_schema()
+    assert connector.upload_to_db(date_times('b'), 'dim_date_times', mode='shadow')
+    connector.swap_shadow_schema()
+
+    connector.rollback_shadow_swap()
+    assert read_uuids(engine) == ['a']
+    assert read_uuids(engine, connector.previous_schema) == ['b']
+
+    # rolling back again swaps the generations back
+    connector.rollback_shadow_swap()
+    assert read_uuids(engine) == ['b']
@@ -0,0 +1,92 @@
+"""
+Tests for resuming retrieve_stores_data from a store checkpoint (STORES_CHECKPOINT_PATH).
+"""
+import json
+import os
+import time
+
+import pytest
+
+from data_extraction import DataExtractor
+
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch):
+    monkeypatch.delenv('STORES_CHECKPOINT_PATH', raising=False)
+    monkeypatch.delenv('STORES_CHECKPOINT_MAX_AGE', raising=False)
+    instance = DataExtractor()
+    instance.no_stores = 3
+    instance.stores_checkpoint_path = str(tmp_path / 'checkpoint.jsonl')
+    return instance
+
+
+def write_checkpoint(path, records):
+    with open(path, 'w') as checkpoint:
+        for record in records:
+            checkpoint.write(json.dumps(record) + '\n')
+
+
+def test_checkpoint_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('STORES_CHECKPOINT_PATH', raising=False)
+    assert DataExtractor().stores_checkpoint_path is None
+
+
+def test_resume_skips_completed_stores(extractor):
+    write_checkpoint(extractor.stores_checkpoint_path, [
+        {'store_number': 0, 'data': {'index': 0}, 'error': None},
+        {'store_number': 1, 'data': None, 'error': 'HTTP 500'},
+    ])
+
+    assert extractor._stores_to_fetch() == [1, 2]
+    assert extractor._completed_stores == {0: {'index': 0}}
+
+
+def test_resume_ignores_stores_that_no_longer_exist(extractor):
+    write_checkpoint(extractor.stores_checkpoint_path, [
+        {'store_number': 0, 'data': {'index': 0}, 'error': None},
+        {'store_number': 5, 'data': {'index': 5}, 'error': None},
+    ])
+
+    assert extractor._stores_to_fetch() == [1, 2]
+    assert list(extractor._completed_stores) == [0]
+
+
+def test_resume_ignores_a_truncated_line(extractor):
+    with open(extractor.stores_checkpoint_path, 'w') as checkpoint:
+        checkpoint.write(json.dumps({'store_number': 0, 'data': {'index': 0}, 'error': None}) + '\n')
+        checkpoint.write('{"store_number": 1, "da')
+
+    assert extractor._stores_to_fetch() == [1, 2]
+
+
+def test_stale_checkpoint_is_discarded(extractor):
+    write_checkpoint(extractor.stores_checkpoint_path, [{'store_number': 0, 'data': {'index': 0}, 'error': None}])
+    old = time.time() - extractor.stores_checkpoint_max_age - 60
+    os.utime(extractor.stores_checkpoint_path, (old, old))
+
+    assert extractor._stores_to_fetch() == [0, 1, 2]
+    assert extractor._completed_stores == {}
+    assert not os.path.exists(extractor.stores_checkpoint_path)
+
+
+def test_checkpoint_is_removed_once_every_store_is_retrieved(extractor):
+    extractor._stores_to_fetch()
+    for store_number in range(3):
+        extractor._record_store_result(store_number, {'index': store_number})
+
+    df_store = extractor._finish_store_fetch()
+
+    assert list(df_store['index']) == [0, 1, 2]
+    assert extractor.df_skipped.empty
+    assert not os.path.exists(extractor.stores_checkpoint_path)
+
+
+def test_checkpoint_is_kept_when_stores_fail(extractor):
+    extractor._stores_to_fetch()
+    extractor._record_store_result(0, {'index': 0})
+    extractor._record_store_result(1, None, 'HTTP 500')
+
+    extractor._finish_store_fetch()
+
+    assert list(extractor.df_skipped['store_number']) == [1, 2]
+    assert os.path.exists(extractor.stores_checkpoint_path)
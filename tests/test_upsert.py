@@ -0,0 +1,131 @@
+"""
+Tests for DatabaseConnector.upsert_to_db against a real Postgres database.
+
+These tests drop and recreate the pipeline tables, so they only run when TEST_DATABASE is set 
+to 'true' and the DB_* (and RDS_*, API_KEY) environment variables point at a throwaway database.
+"""
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+pytestmark = pytest.mark.skipif(os.getenv('TEST_DATABASE', '').lower() != 'true',
+                                reason="set TEST_DATABASE=true to run the database tests")
+
+
+def products_frame(price, names):
+    return pd.DataFrame({
+        'product_name': names,
+        'product_price': [price] * len(names),
+        'weight_in_kg': [1.5] * len(names),
+        'category': ['toys-and-games'] * len(names),
+        'EAN': ['1234567890123'] * len(names),
+        'date_added': ['2005-12-02'] * len(names),
+        'uuid': ['83dc0a69-f96f-4c34-bcb7-928acae19a94'] * len(names),
+        'removed': ['Removed'] * len(names),
+        'product_code': [f"R7-{number}" for number in range(len(names))]
+    })
+
+
+@pytest.fixture
+def connector():
+    from database_utils import DatabaseConnector
+    instance = DatabaseConnector()
+    engine = instance.init_db_engine(prefix="DB")
+    instance.drop_table(engine, 'dim_products')
+    yield instance
+    instance.drop_table(engine, 'dim_products')
+
+
+def cast_products(engine):
+    from data_casting import add_primary_key, cast_dim_products
+    with engine.begin() as connection:
+        cast_dim_products(connection)
+        add_primary_key(connection, 'dim_products', 'product_code')
+
+
+def test_upsert_twice_into_cast_table(connector):
+    engine = connector.init_db_engine(prefix="DB")
+
+    # first run: load and cast the table
+    assert connector.upload_to_db(products_frame('£1.00', ['ball', 'kite']), 'dim_products', mode='replace')
+    cast_products(engine)
+
+    # later runs: upsert raw cleaned frames, with a changed price and a new, longer product name
+    assert connector.upload_to_db(products_frame('£2.50', ['ball', 'kite', 'skateboard']), 'dim_products', mode='upsert')
+    assert connector.upload_to_db(products_frame('£2.50', ['ball', 'kite', 'skateboard']), 'dim_products', mode='upsert')
+
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            'SELECT product_name, product_price, weight_category, is_removed FROM dim_products ORDER BY product_code'
+        )).fetchall()
+
+    assert [tuple(row) for row in rows] == [
+        ('ball', 2.5, 'Light', False),
+        ('kite', 2.5, 'Light', False),
+        ('skateboard', 2.5, 'Light', False)
+    ]
+
+
+def test_casting_is_rerunnable(connector):
+    engine = connector.init_db_engine(prefix="DB")
+    assert connector.upload_to_db(products_frame('£1.00', ['ball']), 'dim_products', mode='replace')
+
+    cast_products(engine)
+    cast_products(engine)
+
+    with engine.connect() as connection:
+        price = connection.execute(text('SELECT product_price FROM dim_products')).scalar()
+    assert price == 1.0
+
+
+USER_UUID = '83dc0a69-f96f-4c34-bcb7-928acae19a94'
+NEW_DATE_UUID = '93dc0a69-f96f-4c34-bcb7-928acae19a94'
+
+
+def pipeline_frames(date_uuid=USER_UUID):
+    return {
+        'dim_users': pd.DataFrame({'first_name': ['ann'], 'last_name': ['lee'], 'date_of_birth': ['1990-01-02'], 'country_code': ['GB'],
+                                   'user_uuid': [USER_UUID], 'join_date': ['2010-01-01']}),
+        'dim_store_details': pd.DataFrame({'longitude': ['1.5'], 'locality': ['London'], 'store_code': ['WEB-1388012W'], 'staff_numbers': [12],
+                                           'opening_date': ['2010-01-01'], 'store_type': ['Web Portal'], 'latitude': ['2.5'],
+                                           'country_code': ['GB'], 'continent': ['Europe']}),
+        'dim_products': products_frame('£1.00', ['ball']),
+        'dim_date_times': pd.DataFrame({'day': ['1'], 'year': ['2020'], 'month': ['2'], 'time_period': ['Evening'], 'date_uuid': [date_uuid]}),
+        'dim_card_details': pd.DataFrame({'expiry_date': ['01/25'], 'card_number': ['4111111111111111'], 'date_payment_confirmed': ['2015-11-25']}),
+        'orders_table': pd.DataFrame({'date_uuid': [date_uuid], 'user_uuid': [USER_UUID], 'card_number': ['4111111111111111'],
+                                      'store_code': ['WEB-1388012W'], 'product_code': ['R7-0'], 'product_quantity': [3]}),
+    }
+
+
+@pytest.fixture
+def cast_pipeline():
+    from data_casting import run_all_operations
+    from database_utils import DatabaseConnector
+    instance = DatabaseConnector()
+    instance.reset_database()
+
+    # first run: load and cast every table, adding the primary and foreign keys
+    for table_name, df in pipeline_frames().items():
+        assert instance.upload_to_db(df, table_name, mode='replace')
+    run_all_operations()
+
+    yield instance
+    instance.reset_database()
+
+
+def test_upsert_orders_after_casting(cast_pipeline):
+    engine = cast_pipeline.init_db_engine(prefix="DB")
+    frames = pipeline_frames(date_uuid=NEW_DATE_UUID)
+
+    # an order for a date that isn't in dim_date_times yet breaks the foreign key
+    assert not cast_pipeline.upload_to_db(frames['orders_table'], 'orders_table', mode='upsert')
+
+    # loading the dim_ tables first, as data_cleaning.py does, lets the new order in
+    for table_name, df in frames.items():
+        assert cast_pipeline.upload_to_db(df, table_name, mode='upsert'), table_name
+
+    with engine.connect() as connection:
+        date_uuids = connection.execute(text('SELECT date_uuid::text FROM orders_table ORDER BY date_uuid')).scalars().all()
+    assert date_uuids == [USER_UUID, NEW_DATE_UUID]
@@ -0,0 +1,34 @@
+"""
+Tests for convert_weights_to_kg, used when cleaning the products data.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaning import convert_weights_to_kg
+
+
+@pytest.mark.parametrize('weight, expected', [
+    ('1.6kg', 1.6),
+    ('500g', 0.5),
+    ('500G', 0.5),
+    ('16oz', 16 * 0.0283495231),
+    ('330ml', 0.33),
+    ('12 x 100g', 1.2),
+    ('3 x 2g', 0.006),
+    ('77g .', 0.077),
+    ('5lb', 0.0),
+])
+def test_units_and_multipacks(weight, expected):
+    assert convert_weights_to_kg(pd.Series([weight]))[0] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('weight', ['heavy', '', None, np.nan])
+def test_unreadable_weights_are_nan(weight):
+    assert np.isnan(convert_weights_to_kg(pd.Series([weight], dtype=object))[0])
+
+
+def test_keeps_the_index():
+    weights = pd.Series(['1kg', '2kg'], index=[7, 3])
+
+    assert convert_weights_to_kg(weights).to_dict() == {7: 1.0, 3: 2.0}